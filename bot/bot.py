@@ -3,7 +3,12 @@ from discord.ext import commands
 from discord.ext import tasks
 from config import settings
 from bot.models.conversation import ConversationManager
+from bot.services.memory_worker import MemoryIngestionWorker
+from bot.services.http import HttpTransport
+from bot.services.image_jobs import ImageJobTracker
+from bot.models.database import close_database
 import logging
+import asyncio
 from datetime import datetime, timedelta
 
 class VigilBot(commands.Bot):
@@ -15,6 +20,10 @@ class VigilBot(commands.Bot):
         intents.guilds = True
         intents.typing = True  # Ensure typing indicator is supported
         self.convo_manager = ConversationManager()
+        self.memory_worker = MemoryIngestionWorker(self.convo_manager)  # Stores memories off the reply path
+        self.database_ready = asyncio.Event()
+        self.http_transport = HttpTransport()  # Pooled outbound HTTP shared by search and image commands
+        self.image_jobs = ImageJobTracker(self.http_transport)  # Polls every in-flight image generation
 
         super().__init__(
             command_prefix=settings.PREFIX,
@@ -24,28 +33,57 @@ class VigilBot(commands.Bot):
 
         # Schedule periodic tasks
         self.cleanup_task = self.start_cleanup_task()
+        self.consolidation_task = self.start_consolidation_task()
         self.logger.info("\033[1;32mBot initialized successfully\033[0m")
 
     def start_cleanup_task(self):
         """Start and configure periodic cleanup task."""
-        @tasks.loop(hours=24)  # Run every 24 hours
+        @tasks.loop(minutes=settings.SHORT_TERM_CLEANUP_MINUTES)  # Small, frequent runs instead of a daily burst
         async def cleanup_task():
             """Clean expired short-term memories."""
             try:
-                self.logger.info("\033[1;34mStarting daily memory cleanup task...\033[0m")
+                self.logger.info("\033[1;34mStarting memory cleanup task...\033[0m")
                 await self.convo_manager.clean_expired_short_term()
-                self.logger.info("\033[1;32mDaily memory cleanup completed\033[0m")
+                self.logger.info("\033[1;32mMemory cleanup completed\033[0m")
             except Exception as e:
                 self.logger.error(f"\033[1;31mError in cleanup task: {e}\033[0m")
 
+        @cleanup_task.before_loop
+        async def before_cleanup():
+            await self.database_ready.wait()  # Tables exist once setup_hook has run
+
         # Start the task and log the next run time
         cleanup_task.start()
-        next_run = datetime.now() + timedelta(hours=24)
+        next_run = datetime.now() + timedelta(minutes=settings.SHORT_TERM_CLEANUP_MINUTES)
         self.logger.info(f"\033[1;33mNext cleanup scheduled for: {next_run.strftime('%Y-%m-%d %H:%M:%S')}\033[0m")
         
         return cleanup_task
 
+    def start_consolidation_task(self):
+        """Start the periodic long-term memory consolidation task."""
+        @tasks.loop(hours=settings.MEMORY_CONSOLIDATION_HOURS)
+        async def consolidation_task():
+            """Deduplicate, decay and cap long-term memories."""
+            try:
+                self.logger.info("\033[1;34mStarting memory consolidation task...\033[0m")
+                await self.convo_manager.consolidate_long_term()
+                self.logger.info("\033[1;32mMemory consolidation completed\033[0m")
+            except Exception as e:
+                self.logger.error(f"\033[1;31mError in consolidation task: {e}\033[0m")
+
+        @consolidation_task.before_loop
+        async def before_consolidation():
+            await self.database_ready.wait()
+
+        consolidation_task.start()
+        return consolidation_task
+
     async def setup_hook(self):
+        # Not caught below: without a database the bot must not come online
+        await self.convo_manager.initialize()
+        self.database_ready.set()
+        self.memory_worker.start()
+        self.image_jobs.start()
         try:
             await self.load_extension("bot.cogs.message_handler")
             await self.load_extension("bot.cogs.image_commands")
@@ -67,5 +105,20 @@ class VigilBot(commands.Bot):
                 await self.cleanup_task
             except Exception as e:
                 print(f"Error stopping cleanup task: {e}")
+        if self.consolidation_task.is_running():
+            # Wait for the cancelled run to unwind so it is not using the database as it closes
+            task = self.consolidation_task.get_task()
+            self.consolidation_task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        print("Draining memory ingestion queue...")
+        await self.memory_worker.stop()
+        await self.convo_manager.close()
+        await self.convo_manager.ai_service.close()
+        await self.image_jobs.stop()
+        await self.http_transport.close()
+        await close_database()
         await super().close()
         print("Cleanup task stopped. Bot is fully shut down.")
\ No newline at end of file
@@ -1,9 +1,11 @@
 import discord
+import asyncio
+from contextlib import aclosing
 from discord.ext import commands
-from bot.models.conversation import ConversationManager
-from bot.services.ai import AIService
 from bot.services.search import SearchService
+from bot.services.context import ContextBuilder
 from config.constants import SystemMessages
+from config import settings
 import pytz
 from datetime import datetime
 
@@ -11,9 +13,10 @@ from datetime import datetime
 class MessageHandler(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.convo_manager = ConversationManager()  # Handles short-term and long-term memory
-        self.ai_service = AIService()  # Connects to Anthropics Claude API for generating messages
-        self.search_service = SearchService()  # Connects to Perplexity API for web searches
+        self.convo_manager = bot.convo_manager  # Handles short-term and long-term memory
+        self.ai_service = self.convo_manager.ai_service  # Shared async Claude client and connection pool
+        self.search_service = SearchService(bot.http_transport)  # Connects to Perplexity API for web searches
+        self.context_builder = ContextBuilder(SystemMessages.VIGIL_PERSONALITY)  # Token-budgeted prompt assembly
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -36,101 +39,167 @@ class MessageHandler(commands.Cog):
             try:
                 # Show typing indicator while the bot is processing the message
                 async with message.channel.typing():
-                    vigil_personality = SystemMessages.VIGIL_PERSONALITY
-                    
-                    if await self.ai_service.should_search_web(question):
-                        search_result = await self.search_service.search_web(question)
-                        if not search_result:
-                            await message.channel.send(
-                                "*Sorry! I'm having trouble fetching data right now. Try again later.*"
-                            )
-                            return
-
-                        # If a web search was required, format the query with the search results
-                        messages = [{
-                            "role": "user",
-                            "content": (
-                                f"Here is factual data to answer with: {search_result}\n\n"
-                                f"Now answer this question in your style: {question}\n\n"
-                                "Remember to incorporate the factual data while maintaining your personality, "
-                                "but don't say 'according to the search' or similar phrases."
-                            )
-                        }]
-                    else:
-                        # Retrieve user memory and combine it with the query for context
-                        user_memory = await self.convo_manager.get_user_memory(
-                            message.author.id,
-                            query=question,
-                            message=message
+                    route, context = await self.build_context(message, question)
+                    if context is None:
+                        await message.channel.send(
+                            "*Sorry! I'm having trouble fetching data right now. Try again later.*"
                         )
-                        long_term_context = [
-                            {"role": "assistant", "content": memory}
-                            for memory in user_memory.get("long_term", [])
-                        ]
-                        short_term_context = [
-                            {"role": "user", "content": mem["user"]}
-                            if i % 2 == 0
-                            else {"role": "assistant", "content": mem["assistant"]}
-                            for i, mem in enumerate(user_memory.get("short_term", []))
-                        ]
-
-                        # Format short-term as alternating user/assistant messages
-                        conversation_history = []
-                        for exchange in user_memory.get("short_term", []):
-                            conversation_history.append({"role": "user", "content": exchange["user"]})
-                            conversation_history.append({"role": "assistant", "content": exchange["assistant"]})
-
-                        # Keep last 2 user messages and their responses
-                        recent_history = conversation_history[-4:] if len(conversation_history) >=4 else conversation_history
-
-                        # Add long-term memories as background knowledge
-                        memory_context = "Relevant memories:\n" + "\n".join(
-                            [f"- {m}" for m in user_memory.get("long_term", [])]
-                        ) if user_memory.get("long_term") else ""
-
-                        # Prepare final message payload
-                        messages = [
-                            {"role": "system", "content": f"{vigil_personality}\n{memory_context}"},
-                            *recent_history,
-                            {"role": "user", "content": question}
-                        ]
+                        return
 
                     # Generate a response using the AI
-                    response = await self.ai_service.generate_response(
-                        messages=messages,
-                        personality_prompt=vigil_personality
-                    )
-                    bot_response = response.strip()
-
-                    # Save the interaction to short-term memory
-                    await self.convo_manager.add_to_short_term(
-                        message.author.id,
-                        question,
-                        bot_response
-                    )
-
-                    # Check if the interaction should be saved to long-term memory
-                    if await self.ai_service.should_save_to_long_term(question):
-                        await self.convo_manager.save_to_long_term(
-                            message.author.id,
-                            f"User stated: {question}",  # Store direct user statement
-                            message
+                    if settings.STREAM_REPLIES:
+                        # Post the first tokens right away and keep editing as the reply streams in
+                        response = await self.send_streamed(
+                            message.channel,
+                            self.ai_service.stream_response(
+                                messages=context["messages"],
+                                personality_prompt=context["system"]
+                            )
                         )
-
-                    # Send the generated response to the user
-                    if len(bot_response) > 2000:  # Handle Discord's character limit
-                        for chunk in [
-                            bot_response[i : i + 2000]  # Split message into chunks
-                            for i in range(0, len(bot_response), 2000)
-                        ]:
-                            await message.channel.send(chunk)
                     else:
-                        await message.channel.send(bot_response)
+                        response = await self.ai_service.generate_response(
+                            messages=context["messages"],
+                            personality_prompt=context["system"]
+                        )
+                    bot_response = response.strip()
+
+                    # Send the generated response to the user (streamed replies are already posted)
+                    if not settings.STREAM_REPLIES:
+                        if len(bot_response) > 2000:  # Handle Discord's character limit
+                            for chunk in [
+                                bot_response[i : i + 2000]  # Split message into chunks
+                                for i in range(0, len(bot_response), 2000)
+                            ]:
+                                await message.channel.send(chunk)
+                        else:
+                            await message.channel.send(bot_response)
+
+                # Short-term memory goes to the write-behind buffer; long-term storage to the worker
+                await self.convo_manager.add_to_short_term(message.author.id, question, bot_response)
+                await self.bot.memory_worker.submit(
+                    message.author.id,
+                    message.guild.id if message.guild else None,
+                    question,
+                    bot_response,
+                    route=route
+                )
 
             except Exception as e:
                 print(f"Error handling message: {e}")
                 await message.channel.send("⚡ Something went wrong. Please try again later!")
 
+    async def build_context(self, message: discord.Message, question: str):
+        """
+        Route the message and assemble the reply prompt. Returns (route, context),
+        with context None if a required web search failed.
+
+        With SPECULATIVE_PIPELINE the short-term history fetch (and, with
+        SPECULATIVE_SEARCH, the web search for messages the prefilter leans towards
+        searching) start alongside the routing call instead of after it; a
+        speculative search is cancelled if routing says no.
+        """
+        short_term_task = search_task = None
+        if settings.SPECULATIVE_PIPELINE:
+            short_term_task = asyncio.create_task(self.convo_manager.get_short_term(message.author.id))
+            if settings.SPECULATIVE_SEARCH and self.ai_service.prefilter.leans("search", question):
+                search_task = asyncio.create_task(self.search_service.search_web(question))
+
+        try:
+            # One routing call decides search, recall and long-term storage
+            route = await self.ai_service.route_message(question)
+
+            if route["search"]:
+                if search_task is not None:
+                    search_result = await search_task
+                else:
+                    search_result = await self.search_service.search_web(question)
+                if not search_result:
+                    return route, None
+
+                # If a web search was required, format the query with the search results
+                context = self.context_builder.build(
+                    question,
+                    user_content=(
+                        f"Here is factual data to answer with: {search_result}\n\n"
+                        f"Now answer this question in your style: {question}\n\n"
+                        "Remember to incorporate the factual data while maintaining your personality, "
+                        "but don't say 'according to the search' or similar phrases."
+                    )
+                )
+            else:
+                if search_task is not None:
+                    search_task.cancel()
+                # Retrieve user memory and combine it with the query for context
+                user_memory = await self.convo_manager.get_user_memory(
+                    message.author.id,
+                    query=question,
+                    message=message,
+                    routing=route,
+                    short_term=await short_term_task if short_term_task is not None else None
+                )
+                # Personality, memories and the last 2 exchanges, under the token budget
+                context = self.context_builder.build(
+                    question,
+                    long_term=user_memory.get("long_term", []),
+                    short_term=user_memory.get("short_term", [])[-2:]
+                )
+            return route, context
+
+        finally:
+            # Speculative work the route did not need
+            for task in (short_term_task, search_task):
+                if task is None:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # Mark a failure as retrieved; it was either awaited or unused
+
+    async def send_streamed(self, channel: discord.abc.Messageable, deltas) -> str:
+        """
+        Post a reply while it streams in. The first non-empty text is sent immediately,
+        then the message is edited at most every STREAM_EDIT_INTERVAL seconds and rolls
+        over to a new message at Discord's 2000-character limit. Returns the full text.
+        """
+        loop = asyncio.get_running_loop()
+        full_text = ""
+        current = ""  # Text belonging to the message being edited
+        shown = ""  # What that message currently displays
+        sent = None
+        last_edit = 0.0
+
+        # Close the stream as soon as we stop reading (e.g. a Discord send fails), so its
+        # scheduler slot and HTTP connection are released now rather than at garbage collection
+        async with aclosing(deltas):
+            async for delta in deltas:
+                full_text += delta
+                current += delta
+
+                # Finalize full messages and roll over to a new one
+                while len(current) > 2000:
+                    head, current = current[:2000], current[2000:]
+                    if sent is None:
+                        await channel.send(head)
+                    elif head != shown:
+                        await sent.edit(content=head)
+                    sent, shown = None, ""
+
+                if not current.strip():
+                    continue
+                if sent is None:
+                    sent = await channel.send(current)
+                    shown, last_edit = current, loop.time()
+                elif current != shown and loop.time() - last_edit >= settings.STREAM_EDIT_INTERVAL:
+                    await sent.edit(content=current)
+                    shown, last_edit = current, loop.time()
+
+        # Flush whatever arrived since the last edit
+        if sent is not None and current != shown:
+            await sent.edit(content=current)
+        elif sent is None and current.strip():
+            await channel.send(current)
+        return full_text
+
 
 async def setup(bot: commands.Bot):
     """
@@ -0,0 +1,108 @@
+"""
+Planning for the periodic long-term memory consolidation job.
+
+The planner works on plain rows and decides what ConversationManager should delete
+or update; it never touches the database itself.
+"""
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from bot.models.short_term_cache import as_utc
+from bot.services import vectors
+from config import settings
+
+# Facts that hold a single value at a time: a newer statement replaces older ones
+SLOT_PATTERNS = [
+    re.compile(r"\bmy (favou?rite \w+(?: \w+)?) (?:is|are)\b"),
+    re.compile(r"\bmy (name|age|birthday|job|pronouns|timezone|hometown|partner|major) (?:is|are)\b"),
+    re.compile(r"\bi (live|work|study) (?:in|at)\b"),
+    re.compile(r"\bi(?:'m| am) \d+ (years) old\b"),
+]
+SLOT_ALIASES = {"favourite": "favorite", "years": "age"}
+
+
+def fact_slots(content: str) -> set:
+    """The single-valued attributes a memory states (e.g. {"favorite color"})."""
+    text = content.lower()
+    return {
+        " ".join(SLOT_ALIASES.get(word, word) for word in match.group(1).split())
+        for pattern in SLOT_PATTERNS
+        for match in pattern.finditer(text)
+    }
+
+
+def plan_consolidation(rows: list, now: datetime, similarity: float, decay_after: timedelta, max_memories: int):
+    """
+    Plan consolidation of one user's long-term memories.
+
+    `rows` carry id, server_id, type, content, importance, embedding, created_at and
+    decayed_at. Within each server scope (server-specific or global):
+      - near-duplicates (cosine >= similarity) collapse into the newest statement,
+        which keeps the highest importance among them;
+      - an older fact about the same slot as a newer one is superseded, unless it
+        states other slots too (it would take those values with it).
+    Importance then drops by one for every full decay_after period without
+    reinforcement, and only the max_memories most important remain.
+
+    Returns (delete_ids, updates) where updates maps id -> changed columns.
+    """
+    delete_ids = set()
+    importance = {row.id: row.importance for row in rows}
+    reinforced = set()
+
+    # Ids break ties between rows saved within the same timestamp resolution
+    newest_first = sorted(rows, key=lambda row: (as_utc(row.created_at), row.id), reverse=True)
+    scopes = {}
+    for row in newest_first:
+        scopes.setdefault(row.server_id, []).append(row)
+
+    for scope_rows in scopes.values():
+        survivors, matrix, slots = [], [], {}
+        for row in scope_rows:
+            vector = vectors.from_bytes(row.embedding) if row.embedding else None
+            if vector is None or vector.shape[0] != settings.EMBEDDING_DIM:
+                vector = vectors.encode(row.content)
+            if survivors:
+                similarities = np.asarray(matrix) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= similarity:
+                    keeper = survivors[best]
+                    importance[keeper.id] = max(importance[keeper.id], importance[row.id])
+                    reinforced.add(keeper.id)
+                    delete_ids.add(row.id)
+                    continue
+            row_slots = {(row.type, slot) for slot in fact_slots(row.content)}
+            if len(row_slots) == 1 and row_slots <= slots.keys():
+                delete_ids.add(row.id)  # Superseded by a newer value
+                continue
+            for key in row_slots:
+                slots.setdefault(key, row.id)
+            survivors.append(row)
+            matrix.append(vector)
+
+    updates = {}
+    for row in rows:
+        if row.id in delete_ids:
+            continue
+        changes = {}
+        if row.id in reinforced:
+            changes["decayed_at"] = now  # Restated facts restart their decay clock
+        else:
+            since = as_utc(row.decayed_at or row.created_at)
+            periods = int((now - since) / decay_after) if decay_after.total_seconds() > 0 else 0
+            if periods and importance[row.id] > 1:
+                importance[row.id] = max(1, importance[row.id] - periods)
+                changes["decayed_at"] = since + periods * decay_after
+        if importance[row.id] != row.importance:
+            changes["importance"] = importance[row.id]
+        if changes:
+            updates[row.id] = changes
+
+    remaining = [row for row in rows if row.id not in delete_ids]
+    if len(remaining) > max_memories:
+        remaining.sort(key=lambda row: (importance[row.id], as_utc(row.created_at)), reverse=True)
+        for row in remaining[max_memories:]:
+            delete_ids.add(row.id)
+            updates.pop(row.id, None)
+
+    return delete_ids, updates
@@ -1,91 +1,160 @@
-from sqlalchemy.orm import Session
+import asyncio
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from bot.models.database import ShortTermMemory, LongTermMemory, initialize_database, SessionLocal
+from bot.models.database import ShortTermMemory, LongTermMemory, type_rank, initialize_database, SessionLocal, WriteSessionLocal, write_engine
+from bot.models import consolidation, fulltext, partitions, queries
+from bot.models.write_buffer import WriteBehindBuffer
+from bot.models.short_term_cache import ShortTermCache, ShortTermRecord
 from bot.services.ai import AIService
+from bot.services import vectors
+from config import settings
 import discord
-from sqlalchemy import or_
+from sqlalchemy import delete, insert, update
 import pytz
 
 
 class ConversationManager:
     SHORT_TERM_MEMORY_DURATION = timedelta(hours=24)  # 24-hour expiration
+    SHORT_TERM_EXCHANGES = 3  # Recent exchanges kept as immediate context
     ai_service = AIService()
+    vector_index = vectors.MemoryVectorIndex(max_entries=settings.VECTOR_CACHE_USERS)
 
     def __init__(self):
-        # Ensure the database tables exist
-        initialize_database()
+        # Short-term rows are buffered and written as multi-row INSERTs
+        self.short_term_buffer = WriteBehindBuffer(
+            self._insert_short_term,
+            flush_rows=settings.SHORT_TERM_FLUSH_ROWS,
+            flush_interval=settings.SHORT_TERM_FLUSH_INTERVAL,
+            name="short_term",
+            max_rows=settings.SHORT_TERM_BUFFER_MAX_ROWS,
+            max_retries=settings.SHORT_TERM_FLUSH_RETRIES
+        )
+        # Hot conversations are served from memory without touching the database
+        self.short_term_cache = ShortTermCache(
+            max_users=settings.SHORT_TERM_CACHE_USERS,
+            per_user=self.SHORT_TERM_EXCHANGES
+        )
+
+    async def initialize(self):
+        """Ensure the database tables exist and start background flushing. Call once the event loop is running."""
+        await initialize_database()
+        self.short_term_buffer.start()
+
+    async def close(self):
+        """Flush buffered writes before shutdown."""
+        await self.short_term_buffer.stop()
 
     @asynccontextmanager
     async def get_db(self):
-        """Provide a database session for async operations."""
-        db = SessionLocal()
-        try:
+        """Provide an async database session."""
+        async with SessionLocal() as db:
+            yield db
+
+    @asynccontextmanager
+    async def get_write_db(self):
+        """Provide an async session for writes (SQLite's single writer connection; the same pool elsewhere)."""
+        async with WriteSessionLocal() as db:
             yield db
-        finally:
-            db.close()
 
     # Short-Term Memory Management
     async def add_to_short_term(self, user_id: int, user_message: str, bot_response: str):
         """Add a memory to short-term storage with an expiration time."""
-        async with self.get_db() as db:
-            current_time = datetime.now(pytz.UTC)
-            expiration_time = current_time + self.SHORT_TERM_MEMORY_DURATION
-            short_memory = ShortTermMemory(
-                user_id=user_id,
-                user_message=user_message,
-                bot_response=bot_response,
-                expiration_time=expiration_time
+        await self.add_short_term_batch([(user_id, user_message, bot_response)])
+
+    async def add_short_term_batch(self, exchanges: list):
+        """Buffer (user_id, user_message, bot_response) exchanges for the next multi-row INSERT."""
+        current_time = datetime.now(pytz.UTC)
+        expiration_time = current_time + self.SHORT_TERM_MEMORY_DURATION
+        await self.short_term_buffer.add([
+            {
+                "user_id": user_id,
+                "user_message": user_message,
+                "bot_response": bot_response,
+                "creation_time": current_time,
+                "expiration_time": expiration_time
+            }
+            for user_id, user_message, bot_response in exchanges
+        ])
+        for user_id, user_message, bot_response in exchanges:
+            self.short_term_cache.append(
+                user_id, ShortTermRecord(user_message, bot_response, current_time, expiration_time)
             )
-            db.add(short_memory)
-            db.commit()
+
+    async def _insert_short_term(self, rows: list):
+        async with self.get_write_db() as db:
+            await db.execute(insert(ShortTermMemory), rows)
+            await db.commit()
 
     async def get_short_term(self, user_id: int):
-        """Retrieve active short-term memories with conversation pairing"""
+        """Retrieve the user's active short-term exchanges in chronological order."""
+        current_time = datetime.now(pytz.UTC)
+        records = self.short_term_cache.get(user_id, current_time)
+        if records is None:
+            records = await self._load_short_term(user_id, current_time)
+        return [
+            {"user": record.user_message, "assistant": record.bot_response}
+            for record in records[-self.SHORT_TERM_EXCHANGES:]
+        ]
+
+    async def _load_short_term(self, user_id: int, current_time: datetime) -> list:
+        """Read recent exchanges from the write buffer and the database, and seed the cache."""
+        self.short_term_cache.begin_load(user_id)
+        # Read the buffer before the database so a concurrent flush can't hide a row
+        buffered = [
+            row for row in self.short_term_buffer.pending()
+            if row["user_id"] == user_id and row["expiration_time"] > current_time
+        ]
         async with self.get_db() as db:
-            current_time = datetime.now(pytz.UTC)
-            memories = (
-                db.query(ShortTermMemory)
-                .filter(ShortTermMemory.user_id == user_id)
-                .filter(ShortTermMemory.expiration_time > current_time)
-                .order_by(ShortTermMemory.creation_time.desc())
-                .limit(6)  # Get last 3 pairs of interactions
-                .all()
+            result = await db.execute(
+                queries.recent_short_term(user_id, current_time, self.SHORT_TERM_EXCHANGES)
             )
-            # Pair messages with their responses
-            paired_memories = []
-            for i in range(0, len(memories)-1, 2):
-                if i+1 < len(memories):
-                    paired_memories.append({
-                        "user": memories[i+1].user_message,
-                        "assistant": memories[i].bot_response
-                    })
-            return paired_memories[::-1]  # Return in chronological order
+            stored = [row._asdict() for row in result]
+
+        # Merge, dropping rows that were flushed between the two reads
+        merged = {}
+        for row in buffered + stored:
+            record = ShortTermRecord(
+                row["user_message"], row["bot_response"], row["creation_time"], row["expiration_time"]
+            )
+            merged[record.key()] = record
+        records = sorted(merged.values(), key=lambda record: record.creation_time)[-self.SHORT_TERM_EXCHANGES:]
+        self.short_term_cache.finish_load(user_id, records)
+        return records
 
     async def clean_expired_short_term(self):
-        """Remove expired short-term memories"""
-        async with self.get_db() as db:
-            try:
-                current_time = datetime.now(pytz.UTC)
-                
-                # Get expired memories based on their expiration time
-                old_memories = db.query(ShortTermMemory).filter(
-                    ShortTermMemory.expiration_time < current_time
-                ).all()
-                
-                deleted_count = 0
-                for memory in old_memories:
-                    # Verify the memory is truly expired
-                    if memory.expiration_time < current_time:
-                        db.delete(memory)
-                        deleted_count += 1
-                
-                db.commit()
-                print(f"Cleaned up {deleted_count} expired memories")
-                
-            except Exception as e:
-                print(f"Error during memory cleanup: {e}")
-                db.rollback()
+        """
+        Remove expired short-term memories. Partitioned tables drop whole expired
+        partitions (and pre-create upcoming ones); otherwise expired rows are deleted
+        in chunks of SHORT_TERM_DELETE_CHUNK, each in its own short transaction.
+        """
+        current_time = datetime.now(pytz.UTC)
+        try:
+            async with write_engine.begin() as conn:
+                if await partitions.is_partitioned(conn):
+                    dropped = await partitions.maintain_partitions(
+                        conn, current_time, settings.SHORT_TERM_PARTITIONS_AHEAD
+                    )
+                    print(f"Dropped {dropped} expired short-term partitions")
+                    return
+
+            deleted_count = 0
+            for _ in range(settings.SHORT_TERM_DELETE_MAX_CHUNKS):
+                async with self.get_write_db() as db:
+                    expired_ids = queries.expired_short_term_ids(
+                        current_time, settings.SHORT_TERM_DELETE_CHUNK
+                    ).scalar_subquery()
+                    result = await db.execute(
+                        delete(ShortTermMemory).where(ShortTermMemory.id.in_(expired_ids))
+                    )
+                    await db.commit()
+                deleted_count += result.rowcount
+                if result.rowcount < settings.SHORT_TERM_DELETE_CHUNK:
+                    break
+                await asyncio.sleep(0)  # Let message handling run between chunks
+            print(f"Cleaned up {deleted_count} expired memories")
+
+        except Exception as e:
+            print(f"Error during memory cleanup: {e}")
 
     # Long-Term Memory Management
     async def extract_server_user_id(self, user_id: int, message: discord.Message):
@@ -93,59 +162,150 @@ class ConversationManager:
         server_id = message.guild.id if message.guild else None
         return user_id, server_id
 
-    async def save_to_long_term(self, user_id: int, content: str, message: discord.Message):
-        """Classify and save memory to long-term storage."""
+    async def save_to_long_term(self, user_id: int, content: str, message: discord.Message, classification: dict = None):
+        """
+        Classify and save memory to long-term storage.
+        Pass the routing decision as `classification` to skip the separate classify call.
+        """
         user_id, server_id = await self.extract_server_user_id(user_id, message)
-        async with self.get_db() as db:
+        if classification is None:
             classification = await self.ai_service.classify_memory(content)  # Invoke AI classification API
-            type_ = classification["type"]  # e.g., "preference", "fact"
-            importance = classification["importance"]  # Importance rating (1-5)
-
-            # Additional logic: Assign 'preference' type for specific keywords like 'favorite'
-            if "favorite" in content.lower():
-                type_ = "preference"
-                importance = max(importance, 4)
-
-            long_memory = LongTermMemory(
-                user_id=user_id,
-                server_id=server_id,
-                type=type_,
-                content=content,
-                importance=importance
-            )
-            db.add(long_memory)
-            db.commit()
+        await self.save_long_term_batch([{
+            "user_id": user_id,
+            "server_id": server_id,
+            "content": content,
+            "classification": classification
+        }])
+
+    async def save_long_term_batch(self, memories: list):
+        """
+        Insert already-classified memories in one transaction.
+        Each item is a dict with user_id, server_id, content and classification.
+        """
+        if not memories:
+            return
+        async with self.get_write_db() as db:
+            db.add_all([self._build_long_term(**memory) for memory in memories])
+            await db.commit()
+        for user_id in {memory["user_id"] for memory in memories}:
+            self.vector_index.invalidate(user_id)
+
+    def _build_long_term(self, user_id: int, server_id: int, content: str, classification: dict) -> LongTermMemory:
+        type_ = classification["type"]  # e.g., "preference", "fact"
+        importance = classification["importance"]  # Importance rating (1-5)
+
+        # Additional logic: Assign 'preference' type for specific keywords like 'favorite'
+        if "favorite" in content.lower():
+            type_ = "preference"
+            importance = max(importance, 4)
 
-    async def get_long_term(self, user_id: int, message: discord.Message):
-        """Retrieve all long-term memories for a user, filter by server ID if available."""
+        return LongTermMemory(
+            user_id=user_id,
+            server_id=server_id,
+            type=type_,
+            type_rank=type_rank(type_),
+            content=content,
+            importance=importance,
+            embedding=vectors.to_bytes(vectors.encode(content))
+        )
+
+    async def get_long_term(self, user_id: int, message: discord.Message, limit: int = None):
+        """
+        Retrieve a user's long-term memories, filtered by server ID if available.
+        Rows are ranked in the database (importance, type, recency) and only the top
+        `limit` are returned, as tuples of id, type, content, importance, embedding, created_at.
+        """
         user_id, server_id = await self.extract_server_user_id(user_id, message)
         async with self.get_db() as db:
-            query = db.query(LongTermMemory).filter(LongTermMemory.user_id == user_id)
-            if server_id:
-                # Use OR condition to get both server-specific and non-server memories
-                query = query.filter(or_(
-                    LongTermMemory.server_id == server_id,
-                    LongTermMemory.server_id.is_(None)
-                ))
-            return query.all()
+            result = await db.execute(queries.long_term_for_user(user_id, server_id, limit))
+            return result.all()
 
     async def delete_long_term(self, user_id: int, memory_type: str = None):
         """Delete specific or all long-term memories for a user."""
-        async with self.get_db() as db:
-            query = db.query(LongTermMemory).filter(LongTermMemory.user_id == user_id)
+        async with self.get_write_db() as db:
+            query = delete(LongTermMemory).where(LongTermMemory.user_id == user_id)
             if memory_type:
-                query = query.filter(LongTermMemory.type == memory_type)
-            query.delete()
-            db.commit()
+                query = query.where(LongTermMemory.type == memory_type)
+            await db.execute(query)
+            await db.commit()
+        self.vector_index.invalidate(user_id)
+
+    async def consolidate_long_term(self):
+        """
+        Merge near-duplicate memories, supersede contradicted facts, decay importance
+        and enforce MEMORY_MAX_PER_USER. Each user is handled in its own transaction.
+        """
+        current_time = datetime.now(pytz.UTC)
+        removed = updated = 0
+        try:
+            async with self.get_db() as db:
+                user_ids = (await db.execute(queries.long_term_users())).scalars().all()
+
+            for user_id in user_ids:
+                async with self.get_write_db() as db:
+                    rows = (await db.execute(queries.long_term_for_consolidation(user_id))).all()
+                    delete_ids, updates = consolidation.plan_consolidation(
+                        rows,
+                        current_time,
+                        similarity=settings.MEMORY_DUPLICATE_SIMILARITY,
+                        decay_after=timedelta(days=settings.MEMORY_DECAY_DAYS),
+                        max_memories=settings.MEMORY_MAX_PER_USER
+                    )
+                    if not delete_ids and not updates:
+                        continue
+                    if delete_ids:
+                        await db.execute(delete(LongTermMemory).where(LongTermMemory.id.in_(delete_ids)))
+                    for memory_id, changes in updates.items():
+                        await db.execute(update(LongTermMemory).where(LongTermMemory.id == memory_id).values(**changes))
+                    await db.commit()
+                self.vector_index.invalidate(user_id)
+                removed += len(delete_ids)
+                updated += len(updates)
+                await asyncio.sleep(0)  # Let message handling run between users
+            print(f"Consolidated long-term memories: {removed} removed, {updated} updated")
+
+        except Exception as e:
+            print(f"Error during memory consolidation: {e}")
+
+    async def search_long_term(self, user_id: int, message: discord.Message, query: str, limit: int):
+        """Return up to limit long-term memories matching query's keywords, best match first."""
+        user_id, server_id = await self.extract_server_user_id(user_id, message)
+        async with self.get_db() as db:
+            return await fulltext.search(db, user_id, server_id, query, limit)
+
+    async def get_long_term_candidates(self, user_id: int, message: discord.Message, query: str, k: int, limit: int):
+        """
+        Return the k long-term memories most similar to query, searched among the
+        `limit` best-ranked memories in the database.
+        """
+        user_id, server_id = await self.extract_server_user_id(user_id, message)
+        key = (user_id, server_id, limit)
+        if key not in self.vector_index:
+            self.vector_index.load(key, await self.get_long_term(user_id, message, limit))
+        return self.vector_index.top_k(key, query, k)
 
     # Combine Short-Term and Long-Term Memory for Context
-    async def get_user_memory(self, user_id: int, message: discord.Message, query: str = None):
+    async def get_user_memory(
+        self,
+        user_id: int,
+        message: discord.Message,
+        query: str = None,
+        routing: dict = None,
+        candidate_limit: int = None,
+        short_term: list = None
+    ):
         """
         Retrieve both short-term and relevant long-term memory for a user.
-        Implements AI-based memory recall system.
+        Implements AI-based memory recall system. When a routing decision from
+        AIService.route_message is given, its recall flag replaces the separate recall check.
+        `candidate_limit` caps how many ranked memories are read from the database
+        (defaults to MEMORY_CANDIDATE_LIMIT). Pass `short_term` if the caller already
+        fetched get_short_term (e.g. concurrently with routing).
         """
         # Get recent conversation context (short-term)
-        short_term_memories = await self.get_short_term(user_id)
+        if short_term is None:
+            short_term = await self.get_short_term(user_id)
+        short_term_memories = short_term
         
         # Only keep last 3 interactions for immediate context
         short_term_memories = short_term_memories[-3:] if short_term_memories else []
@@ -154,40 +314,48 @@ class ConversationManager:
             return {"short_term": short_term_memories, "long_term": []}
         
         # Use AI to determine if we need to recall memories
-        if await self.ai_service.needs_memory_recall(query):
-            long_term_memories = await self.get_long_term(user_id, message)
+        if routing is not None:
+            needs_recall = routing.get("recall", False)
+        else:
+            needs_recall = await self.ai_service.needs_memory_recall(query)
+
+        if needs_recall:
+            # Only keyword matches from the full-text index go on to LLM scoring; with
+            # none, fall back to the nearest memories by local cosine similarity
+            long_term_memories = await self.search_long_term(
+                user_id, message, query, settings.MEMORY_KEYWORD_TOP_K
+            )
+            if not long_term_memories:
+                long_term_memories = await self.get_long_term_candidates(
+                    user_id, message, query, settings.MEMORY_VECTOR_TOP_K,
+                    candidate_limit or settings.MEMORY_CANDIDATE_LIMIT
+                )
             
-            # Score memories based on relevance to query
+            # Skip bot-generated interpretations
+            candidates = [
+                memory for memory in long_term_memories
+                if "you said" not in memory.content.lower() and "you mentioned" not in memory.content.lower()
+            ]
+
+            # Score every candidate against the query in one batched pass
+            scores = await self.ai_service.score_memories(query, [memory.content for memory in candidates])
             scored_memories = []
-            for memory in long_term_memories:
-                # Skip bot-generated interpretations
-                if "you said" in memory.content.lower() or "you mentioned" in memory.content.lower():
-                    continue
-                
-                # Combined validation and scoring
-                try:
-                    # Single API call for both validation and scoring
-                    score = await self.ai_service.get_memory_relevance_score(query, memory.content)
-                    if score < 0.5:  # Lower threshold for better recall
-                        continue
-                    
-                    # Apply importance boost
-                    score *= memory.importance
-                    scored_memories.append((score, memory.content))
-                except Exception as e:
-                    self.logger.error(f"Memory scoring error: {e}")
+            for memory, score in zip(candidates, scores):
+                if score < 0.5:  # Lower threshold for better recall
                     continue
-            
+                # Apply importance boost
+                scored_memories.append((score * memory.importance, memory.content))
+
             # Sort by score and take top 2 most relevant memories
             filtered_long_term = [
                 content for _, content in sorted(scored_memories, reverse=True)
             ][:2]
 
-            # Filter based on relevance to current conversation
-            relevant_long_term = []
-            for memory in filtered_long_term:
-                if await self.ai_service.check_memory_relevance(memory, query):
-                    relevant_long_term.append(memory)
+            # Filter based on relevance to current conversation (checks run concurrently)
+            checks = await asyncio.gather(*(
+                self.ai_service.check_memory_relevance(memory, query) for memory in filtered_long_term
+            ))
+            relevant_long_term = [memory for memory, relevant in zip(filtered_long_term, checks) if relevant]
 
             # Format memories for better context if we found any
             if relevant_long_term:
@@ -200,4 +368,4 @@ class ConversationManager:
         return {
             "short_term": short_term_memories,
             "long_term": relevant_long_term
-        }
\ No newline at end of file
+        }
@@ -1,49 +1,181 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, BigInteger, DateTime, func, Index
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, BigInteger, DateTime, LargeBinary, func, Index, text, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
 from config import settings
+from contextlib import asynccontextmanager
 from datetime import datetime
+import pytz
+from bot.models import partitions
+
+
+def _async_engine_args(url: str):
+    """Map DATABASE_URL onto an async driver and its connection options."""
+    url = make_url(url)
+    connect_args = {}
+    if url.get_backend_name() in ("postgresql", "postgres"):
+        url = url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes ssl instead of libpq's sslmode (Supabase URLs carry ?sslmode=require)
+        if "sslmode" in url.query:
+            connect_args["ssl"] = url.query["sslmode"]
+            url = url.difference_update_query(["sslmode"])
+        connect_args["command_timeout"] = settings.DB_STATEMENT_TIMEOUT
+        connect_args["server_settings"] = {"statement_timeout": str(int(settings.DB_STATEMENT_TIMEOUT * 1000))}
+        # Transaction-mode poolers (Supabase/pgbouncer) cannot use prepared statement caches
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        options = {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE
+        }
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+        connect_args["timeout"] = settings.SQLITE_BUSY_TIMEOUT
+        if _is_memory_sqlite(url):
+            # Every connection to :memory: is a separate database, so share one
+            options = {"poolclass": StaticPool}
+        else:
+            # Reader pool; writes go through write_engine's single connection
+            options = {
+                "poolclass": AsyncAdaptedQueuePool,
+                "pool_size": settings.SQLITE_READERS,
+                "max_overflow": 0,
+                "pool_timeout": settings.DB_POOL_TIMEOUT
+            }
+    else:
+        options = {}
+    return url, {"pool_pre_ping": True, "connect_args": connect_args, **options}
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.database in (None, "", ":memory:")
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection: WAL lets readers run alongside the writer."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe with WAL
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT * 1000)}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_MB * 1024}")  # Negative means KiB
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_MB * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
 
 # Database setup
 DATABASE_URL = settings.DATABASE_URL  # Use environment variable to provide DB URL
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+_url, _engine_options = _async_engine_args(DATABASE_URL)
+engine = create_async_engine(_url, **_engine_options)
+if engine.dialect.name == "sqlite" and not _is_memory_sqlite(_url):
+    # A dedicated single-connection writer serialises writes in-process instead of
+    # letting connections contend for SQLite's database lock
+    write_engine = create_async_engine(
+        _url, **{**_engine_options, "pool_size": 1, "max_overflow": 0, "pool_timeout": None}
+    )
+else:
+    write_engine = engine
+if engine.dialect.name == "sqlite":
+    for _sqlite_engine in {engine, write_engine}:
+        event.listen(_sqlite_engine.sync_engine, "connect", _sqlite_pragmas)
+SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+WriteSessionLocal = async_sessionmaker(bind=write_engine, expire_on_commit=False)
 Base = declarative_base()
 
 
 # Short-Term Memory Model
+# On PostgreSQL short-term memory is range-partitioned by day of expiration_time (see
+# bot/models/partitions.py). The primary key must then include the partition key, and
+# create_all emits the partitioned table together with its indexes on the parent.
+SHORT_TERM_PARTITIONED = engine.dialect.name == "postgresql" and settings.SHORT_TERM_PARTITIONING
+
+
 class ShortTermMemory(Base):
     __tablename__ = "short_term_memories"
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(BigInteger, index=True, nullable=False)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
     user_message = Column(Text, nullable=False)
     bot_response = Column(Text, nullable=False)
     creation_time = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    expiration_time = Column(DateTime(timezone=True), nullable=False)
+    expiration_time = Column(DateTime(timezone=True), nullable=False, primary_key=SHORT_TERM_PARTITIONED)
 
     __table_args__ = (
         Index('idx_short_term_expiration', 'expiration_time'),
+        # get_short_term: user_id equality, newest first, expiry checked from the index
+        Index('idx_short_term_user_recent', 'user_id', text('creation_time DESC'), 'expiration_time'),
+        {"postgresql_partition_by": "RANGE (expiration_time)"} if SHORT_TERM_PARTITIONED else {},
     )
 
 
+# Within equal importance, stable traits outrank incidental facts (lower ranks first)
+TYPE_RANKS = {"preference": 0, "fact": 1}
+DEFAULT_TYPE_RANK = 2
+
+
+def type_rank(memory_type: str) -> int:
+    return TYPE_RANKS.get(memory_type, DEFAULT_TYPE_RANK)
+
+
 # Long-Term Memory Model
 class LongTermMemory(Base):
     __tablename__ = "long_term_memories"
 
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(BigInteger, index=True, nullable=False)
-    server_id = Column(BigInteger, index=True, nullable=True)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)
+    server_id = Column(BigInteger, nullable=True)
     type = Column(String(50), nullable=False)  # e.g., "preference", "fact"
+    type_rank = Column(SmallInteger, nullable=False, server_default=str(DEFAULT_TYPE_RANK))  # See TYPE_RANKS
     content = Column(Text, nullable=False)
     importance = Column(Integer, default=1, nullable=False)  # Importance level (1 to 5)
+    embedding = Column(LargeBinary, nullable=True)  # Local float32 embedding of content
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    decayed_at = Column(DateTime(timezone=True), nullable=True)  # Last importance decay or reinforcement
 
     __table_args__ = (
+        # get_long_term: user_id equality with server_id = ? OR server_id IS NULL
         Index('idx_user_server', 'user_id', 'server_id'),
+        # get_long_term candidates: a user's memories in ranking order, read until the limit
+        Index('idx_long_term_user_rank', 'user_id', text('importance DESC'), 'type_rank', text('created_at DESC')),
     )
 
 
-# Create tables in the database
-def initialize_database():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+@asynccontextmanager
+async def migration_connection():
+    """
+    A connection in a transaction for schema changes. On PostgreSQL it is a separate,
+    unpooled connection without the DB_STATEMENT_TIMEOUT limits, since index builds
+    and backfills on large tables run far longer than application queries.
+    """
+    if engine.dialect.name != "postgresql":
+        async with write_engine.begin() as conn:
+            yield conn
+        return
+    connect_args = {
+        key: value for key, value in _engine_options["connect_args"].items()
+        if key not in ("command_timeout", "server_settings")
+    }
+    migration_engine = create_async_engine(_url, poolclass=NullPool, connect_args=connect_args)
+    try:
+        async with migration_engine.begin() as conn:
+            yield conn
+    finally:
+        await migration_engine.dispose()
+
+
+# Create or upgrade tables in the database
+async def initialize_database():
+    from bot.models import migrations
+    async with migration_connection() as conn:
+        await migrations.upgrade(conn)
+        if await partitions.is_partitioned(conn):
+            await partitions.maintain_partitions(conn, datetime.now(pytz.UTC), settings.SHORT_TERM_PARTITIONS_AHEAD)
+
+
+async def close_database():
+    """Dispose of pooled connections on shutdown."""
+    if write_engine is not engine:
+        await write_engine.dispose()
+    await engine.dispose()
@@ -0,0 +1,91 @@
+import re
+from sqlalchemy import text
+from bot.services.vectors import STOPWORDS
+
+TABLE = "long_term_memories"
+FTS_TABLE = f"{TABLE}_fts"  # SQLite FTS5 index over content
+TEXT_SEARCH_CONFIG = "english"  # PostgreSQL stemming and stopwords
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Question words that match almost any memory lexically
+QUERY_STOPWORDS = STOPWORDS | {"who", "where", "when", "why", "how", "which", "can", "did", "know", "remember", "about"}
+MAX_QUERY_TERMS = 16
+
+# PostgreSQL: a generated tsvector column is maintained by the database on every write
+POSTGRES_DDL = [
+    f"ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', content)) STORED",
+    f"CREATE INDEX IF NOT EXISTS idx_long_term_content_fts ON {TABLE} USING GIN (content_tsv)",
+]
+
+# SQLite: an external-content FTS5 table kept in sync by triggers
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"content, content='{TABLE}', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF content ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+    f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",  # Index rows that predate the table
+]
+
+COLUMNS = "m.id, m.type, m.content, m.importance, m.embedding, m.created_at"
+SERVER_FILTER = "AND (m.server_id = :server_id OR m.server_id IS NULL)"
+
+POSTGRES_SEARCH = f"""
+SELECT {COLUMNS}
+FROM {TABLE} m, to_tsquery('{TEXT_SEARCH_CONFIG}', :terms) query
+WHERE m.user_id = :user_id {{server_filter}} AND m.content_tsv @@ query
+ORDER BY ts_rank_cd(m.content_tsv, query) DESC, m.importance DESC
+LIMIT :limit
+"""
+
+SQLITE_SEARCH = f"""
+SELECT {COLUMNS}
+FROM {FTS_TABLE} JOIN {TABLE} m ON m.id = {FTS_TABLE}.rowid
+WHERE {FTS_TABLE} MATCH :terms AND m.user_id = :user_id {{server_filter}}
+ORDER BY {FTS_TABLE}.rank, m.importance DESC
+LIMIT :limit
+"""
+
+
+def supported(dialect: str) -> bool:
+    return dialect in ("postgresql", "sqlite")
+
+
+async def create_index(conn):
+    """Create the full-text index for the connection's dialect and index existing rows."""
+    statements = {"postgresql": POSTGRES_DDL, "sqlite": SQLITE_DDL}.get(conn.dialect.name, [])
+    for statement in statements:
+        await conn.execute(text(statement))
+
+
+def query_terms(query: str) -> list:
+    """Distinct significant words of a query, in order."""
+    words = [word for word in WORD_PATTERN.findall((query or "").lower()) if word not in QUERY_STOPWORDS]
+    return list(dict.fromkeys(words))[:MAX_QUERY_TERMS]
+
+
+async def search(db, user_id: int, server_id: int, query: str, limit: int) -> list:
+    """
+    Rank a user's memories for this server plus global ones by keyword match with
+    query, best first. Any significant word may match. Returns row tuples shaped
+    like queries.long_term_for_user, or [] when the query has no searchable words.
+    """
+    dialect = db.bind.dialect.name
+    terms = query_terms(query)
+    if not terms or not supported(dialect):
+        return []
+    if dialect == "postgresql":
+        statement, terms = POSTGRES_SEARCH, " | ".join(terms)
+    else:
+        statement, terms = SQLITE_SEARCH, " OR ".join(f'"{term}"' for term in terms)
+    params = {"terms": terms, "user_id": user_id, "limit": limit}
+    if server_id:
+        params["server_id"] = server_id
+    statement = statement.format(server_filter=SERVER_FILTER if server_id else "")
+    result = await db.execute(text(statement), params)
+    return result.all()
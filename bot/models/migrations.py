@@ -0,0 +1,227 @@
+"""
+Versioned schema migrations for Vigil's memory tables.
+
+Each migration runs once, in order, and is recorded in `schema_migrations`.
+Migrations are written to be idempotent so databases created before versioning
+(plain `create_all`) upgrade cleanly.
+
+Usage:
+    python -m bot.models.migrations upgrade   # apply pending migrations
+    python -m bot.models.migrations status    # list applied/pending versions
+    python -m bot.models.migrations explain   # EXPLAIN every ConversationManager query
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime
+import pytz
+from sqlalchemy import inspect, text, DateTime, LargeBinary
+from bot.models import fulltext, partitions, queries
+from bot.models.database import (
+    Base, SHORT_TERM_PARTITIONED, TYPE_RANKS, DEFAULT_TYPE_RANK, close_database, engine, migration_connection, write_engine
+)
+
+logger = logging.getLogger("Vigil.Migrations")
+
+MIGRATION_LOCK_ID = 0x56494749  # Postgres advisory lock key ("VIGI")
+
+
+async def _baseline(conn):
+    """Tables as originally created by initialize_database()."""
+    # Fresh PostgreSQL databases get a partitioned table; existing plain tables are left as they are
+    await conn.run_sync(Base.metadata.create_all)
+    if SHORT_TERM_PARTITIONED and await partitions.is_partitioned(conn):
+        await partitions.create_default_partition(conn)
+
+
+async def _add_column(conn, table: str, column: str, column_type):
+    columns = await conn.run_sync(lambda sync: [c["name"] for c in inspect(sync).get_columns(table)])
+    if column not in columns:
+        compiled = column_type.compile(dialect=conn.dialect)
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {compiled}"))
+
+
+async def _long_term_embedding(conn):
+    """Add the local embedding column used by the vector index."""
+    await _add_column(conn, "long_term_memories", "embedding", LargeBinary())
+
+
+async def _create_model_indexes(conn, *names):
+    """Create the named model indexes (with their current definitions) that do not exist yet."""
+    def create(sync):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(sync, checkfirst=True)
+
+    await conn.run_sync(create)
+
+
+async def _query_indexes(conn):
+    """
+    Indexes designed for the real access paths (see bot/models/queries.py), and
+    removal of single-column indexes they make redundant.
+    """
+    await _create_model_indexes(conn, "idx_short_term_expiration", "idx_short_term_user_recent", "idx_user_server")
+    for obsolete in (
+        "ix_short_term_memories_id",  # Duplicates the primary key
+        "ix_short_term_memories_user_id",  # Prefix of idx_short_term_user_recent
+        "ix_long_term_memories_id",  # Duplicates the primary key
+        "ix_long_term_memories_user_id",  # Prefix of idx_user_server
+        "ix_long_term_memories_server_id"  # No query filters on server_id alone
+    ):
+        await conn.execute(text(f"DROP INDEX IF EXISTS {obsolete}"))
+
+
+async def _long_term_decay(conn):
+    """Track when consolidation last decayed or reinforced a memory's importance."""
+    await _add_column(conn, "long_term_memories", "decayed_at", DateTime(timezone=True))
+
+
+async def _long_term_rank_index(conn):
+    """Index serving top-K long-term candidate selection (replaced in migration 7)."""
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_long_term_user_rank "
+        "ON long_term_memories (user_id, importance DESC, created_at DESC)"
+    ))
+
+
+async def _long_term_fulltext(conn):
+    """Full-text index over long-term memory content (tsvector/GIN or FTS5)."""
+    await fulltext.create_index(conn)
+
+
+async def _long_term_type_rank(conn):
+    """
+    Store each memory's type rank so the ranking index covers the whole ORDER BY
+    of long_term_for_user (a CASE expression could only be sorted after the scan).
+    """
+    columns = await conn.run_sync(lambda sync: [c["name"] for c in inspect(sync).get_columns("long_term_memories")])
+    if "type_rank" not in columns:
+        await conn.execute(text(
+            f"ALTER TABLE long_term_memories ADD COLUMN type_rank SMALLINT NOT NULL DEFAULT {DEFAULT_TYPE_RANK}"
+        ))
+    for memory_type, rank in TYPE_RANKS.items():
+        await conn.execute(
+            text("UPDATE long_term_memories SET type_rank = :rank WHERE type = :type"),
+            {"rank": rank, "type": memory_type}
+        )
+    await conn.execute(text("DROP INDEX IF EXISTS idx_long_term_user_rank"))
+    await _create_model_indexes(conn, "idx_long_term_user_rank")
+
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "long-term memory embedding column", _long_term_embedding),
+    (3, "query-driven indexes", _query_indexes),
+    (4, "long-term memory decay tracking", _long_term_decay),
+    (5, "long-term candidate ranking index", _long_term_rank_index),
+    (6, "long-term memory full-text index", _long_term_fulltext),
+    (7, "long-term memory type rank", _long_term_type_rank),
+]
+
+
+async def _applied_versions(conn) -> set:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+
+async def upgrade(conn):
+    """
+    Apply pending migrations inside the caller's transaction. Use a connection from
+    migration_connection(): index builds and backfills outlast the app's timeouts.
+    """
+    if conn.dialect.name == "postgresql":
+        # Also lifts a statement_timeout set on the database role (e.g. by Supabase)
+        await conn.execute(text("SET LOCAL statement_timeout = 0"))
+        # Serialise concurrent bot instances starting at the same time
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+    applied = await _applied_versions(conn)
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"Applying migration {version}: {name}")
+        await migrate(conn)
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+            {"version": version, "name": name, "applied_at": datetime.utcnow()}
+        )
+
+
+async def status() -> list:
+    async with write_engine.begin() as conn:
+        applied = await _applied_versions(conn)
+    return [(version, name, version in applied) for version, name, _ in MIGRATIONS]
+
+
+def _plan_regressions(dialect: str, plan: list) -> list:
+    """Plan lines that read a memory table without an index, or sort rows the index should order."""
+    if dialect == "postgresql":
+        return [line for line in plan if ("Seq Scan" in line and "_memories" in line) or "Sort  (" in line]
+    if dialect == "sqlite":
+        return [
+            line for line in plan
+            if (line.lstrip().startswith("SCAN") and "INDEX" not in line) or "TEMP B-TREE" in line
+        ]
+    return []
+
+
+async def explain() -> bool:
+    """
+    EXPLAIN every ConversationManager read path and report plans that fall back
+    to full table scans or sort in memory. On PostgreSQL sequential scans are disabled for the check,
+    so a Seq Scan in the plan means no usable index exists. Returns True if clean.
+    """
+    clean = True
+    async with engine.connect() as conn:
+        dialect = conn.dialect.name
+        for name, statement in queries.explain_samples(datetime.now(pytz.UTC)).items():
+            compiled = statement.compile(dialect=conn.dialect)
+            params = compiled.params
+            if compiled.positional:
+                params = tuple(compiled.params[key] for key in compiled.positiontup)
+            async with conn.begin():
+                if dialect == "postgresql":
+                    await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+                    result = await conn.exec_driver_sql(f"EXPLAIN {compiled.string}", params)
+                    plan = [row[0] for row in result]
+                elif dialect == "sqlite":
+                    result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled.string}", params)
+                    plan = [row[-1] for row in result]
+                else:
+                    print(f"EXPLAIN is not supported for {dialect}")
+                    return True
+            regressions = _plan_regressions(dialect, plan)
+            clean = clean and not regressions
+            print(f"{'REGRESSION' if regressions else 'OK'}: {name}")
+            for line in plan:
+                print(f"    {line}")
+    return clean
+
+
+async def _main(command: str) -> int:
+    try:
+        if command == "upgrade":
+            async with migration_connection() as conn:
+                await upgrade(conn)
+            print("Database is up to date")
+        elif command == "status":
+            for version, name, applied in await status():
+                print(f"{version:>4}  {'applied' if applied else 'pending':<8} {name}")
+        elif command == "explain":
+            return 0 if await explain() else 1
+        else:
+            print(__doc__)
+            return 2
+        return 0
+    finally:
+        await close_database()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else "")))
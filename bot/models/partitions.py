@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import text
+
+TABLE = "short_term_memories"
+PARTITION_PREFIX = f"{TABLE}_p"
+
+# Short-term memory is partitioned into daily ranges of expiration_time, so expiry
+# drops whole partitions instead of deleting rows
+LIST_PARTITIONS = f"""
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = '{TABLE}'
+"""
+
+
+async def create_default_partition(conn):
+    """
+    Catch-all partition for rows outside the daily ranges. The partitioned table
+    itself (primary key and indexes included) comes from the ShortTermMemory model.
+    """
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+
+
+async def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+    ), {"table": TABLE})
+    return result.first() is not None
+
+
+def _partition_day(name: str):
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").replace(tzinfo=pytz.UTC)
+    except ValueError:
+        return None  # The default partition
+
+
+async def maintain_partitions(conn, now: datetime, days_ahead: int) -> int:
+    """
+    Create daily partitions from today through days_ahead and drop every partition
+    whose whole range has expired. Returns the number of partitions dropped.
+    """
+    today = now.astimezone(pytz.UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+    existing = {row[0] for row in await conn.execute(text(LIST_PARTITIONS))}
+
+    for offset in range(days_ahead + 1):
+        start = today + timedelta(days=offset)
+        name = f"{PARTITION_PREFIX}{start:%Y%m%d}"
+        if name not in existing:
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + timedelta(days=1)).isoformat()}')"
+            ))
+
+    # Stragglers routed to the default partition are few; delete them directly
+    await conn.execute(text(f"DELETE FROM {TABLE}_default WHERE expiration_time < :now"), {"now": now})
+
+    dropped = 0
+    for name in sorted(existing):
+        start = _partition_day(name)
+        if start is not None and start + timedelta(days=1) <= now:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped += 1
+    return dropped
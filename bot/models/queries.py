@@ -0,0 +1,92 @@
+"""
+Statements issued by ConversationManager, built in one place so the migration
+tool can EXPLAIN exactly what the bot runs.
+"""
+from datetime import datetime
+from sqlalchemy import or_, select
+from bot.models.database import ShortTermMemory, LongTermMemory
+
+
+def recent_short_term(user_id: int, now: datetime, limit: int):
+    """Latest unexpired exchanges for a user (idx_short_term_user_recent)."""
+    return (
+        select(
+            ShortTermMemory.user_message,
+            ShortTermMemory.bot_response,
+            ShortTermMemory.creation_time,
+            ShortTermMemory.expiration_time
+        )
+        .where(ShortTermMemory.user_id == user_id)
+        .where(ShortTermMemory.expiration_time > now)
+        .order_by(ShortTermMemory.creation_time.desc())
+        .limit(limit)
+    )
+
+
+def expired_short_term_ids(now: datetime, limit: int):
+    """One chunk of expired short-term row ids (idx_short_term_expiration)."""
+    return (
+        select(ShortTermMemory.id)
+        .where(ShortTermMemory.expiration_time < now)
+        .limit(limit)
+    )
+
+
+def long_term_for_user(user_id: int, server_id: int = None, limit: int = None):
+    """
+    A user's memories for this server plus global ones, best first: by importance,
+    then type, then recency (idx_long_term_user_rank). Selects only the columns
+    recall needs, so rows come back as lightweight tuples.
+    """
+    query = select(
+        LongTermMemory.id,
+        LongTermMemory.type,
+        LongTermMemory.content,
+        LongTermMemory.importance,
+        LongTermMemory.embedding,
+        LongTermMemory.created_at
+    ).where(LongTermMemory.user_id == user_id)
+    if server_id:
+        # Use OR condition to get both server-specific and non-server memories
+        query = query.where(or_(
+            LongTermMemory.server_id == server_id,
+            LongTermMemory.server_id.is_(None)
+        ))
+    # Matches idx_long_term_user_rank column for column, so no sort step is needed
+    query = query.order_by(
+        LongTermMemory.importance.desc(),
+        LongTermMemory.type_rank,
+        LongTermMemory.created_at.desc()
+    )
+    return query.limit(limit) if limit else query
+
+
+def long_term_users():
+    """Every user with long-term memories, for consolidation (idx_user_server)."""
+    return select(LongTermMemory.user_id).distinct().order_by(LongTermMemory.user_id)
+
+
+def long_term_for_consolidation(user_id: int):
+    """All of a user's memories across servers, without ORM objects (idx_user_server)."""
+    return select(
+        LongTermMemory.id,
+        LongTermMemory.server_id,
+        LongTermMemory.type,
+        LongTermMemory.content,
+        LongTermMemory.importance,
+        LongTermMemory.embedding,
+        LongTermMemory.created_at,
+        LongTermMemory.decayed_at
+    ).where(LongTermMemory.user_id == user_id)
+
+
+def explain_samples(now: datetime) -> dict:
+    """Representative instances of every read path, keyed by name, for plan checks."""
+    return {
+        "get_short_term": recent_short_term(1, now, 3),
+        "clean_expired_short_term": expired_short_term_ids(now, 1000),
+        "get_long_term (server)": long_term_for_user(1, 1, 200),
+        "get_long_term (direct message)": long_term_for_user(1, None, 200),
+        "consolidate_long_term (users)": long_term_users(),
+        "consolidate_long_term (memories)": long_term_for_consolidation(1)
+    }
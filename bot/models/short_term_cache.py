@@ -0,0 +1,91 @@
+from collections import OrderedDict, deque
+from datetime import datetime
+import pytz
+
+
+class ShortTermRecord:
+    """One cached exchange (a ShortTermMemory row without ORM overhead)."""
+    __slots__ = ("user_message", "bot_response", "creation_time", "expiration_time")
+
+    def __init__(self, user_message: str, bot_response: str, creation_time: datetime, expiration_time: datetime):
+        self.user_message = user_message
+        self.bot_response = bot_response
+        self.creation_time = as_utc(creation_time)
+        self.expiration_time = as_utc(expiration_time)
+
+    def key(self) -> tuple:
+        return (self.user_message, self.bot_response, self.creation_time)
+
+
+class _UserHistory:
+    __slots__ = ("records", "loaded")
+
+    def __init__(self, size: int):
+        self.records = deque(maxlen=size)
+        self.loaded = False
+
+
+class ShortTermCache:
+    """
+    Per-user ring buffers holding each active user's latest exchanges.
+
+    Users are evicted least-recently-used past `max_users`, and records are dropped
+    once past their expiration time (the same SHORT_TERM_MEMORY_DURATION used in the
+    database). Writes go through `append`; a user's buffer only answers reads after
+    `finish_load` has seeded it from storage, so a hit is always complete.
+    """
+    def __init__(self, max_users: int, per_user: int):
+        self.max_users = max_users
+        self.per_user = per_user
+        self._users = OrderedDict()  # user_id -> _UserHistory
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, now: datetime):
+        """Return the user's unexpired records oldest-first, or None if not cached."""
+        history = self._users.get(user_id)
+        if history is None or not history.loaded:
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        while history.records and history.records[0].expiration_time <= now:
+            history.records.popleft()
+        if not history.records:
+            del self._users[user_id]  # Idle past expiry: nothing left to serve
+            return []
+        return list(history.records)
+
+    def append(self, user_id: int, record: ShortTermRecord):
+        """Write-through from add_to_short_term; only users already being cached are updated."""
+        history = self._users.get(user_id)
+        if history is not None:
+            history.records.append(record)
+
+    def begin_load(self, user_id: int):
+        """Reserve a buffer before reading storage so writes during the read are captured."""
+        if user_id not in self._users:
+            self._users[user_id] = _UserHistory(self.per_user)
+            self._evict()
+
+    def finish_load(self, user_id: int, records: list):
+        """Seed a reserved buffer with records read from storage (any order)."""
+        history = self._users.get(user_id)
+        if history is None or history.loaded:
+            return
+        merged = {record.key(): record for record in [*records, *history.records]}
+        history.records.clear()
+        history.records.extend(sorted(merged.values(), key=lambda record: record.creation_time))
+        history.loaded = True
+
+    def _evict(self):
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"users": len(self._users), "hits": self.hits, "misses": self.misses}
+
+
+def as_utc(value: datetime) -> datetime:
+    """Treat naive timestamps (e.g. from SQLite) as UTC so they compare with aware ones."""
+    return value.replace(tzinfo=pytz.UTC) if value.tzinfo is None else value
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from sqlalchemy.exc import DataError, IntegrityError
+
+# Failures caused by the rows themselves; retrying them can never succeed
+BAD_ROW_ERRORS = (IntegrityError, DataError)
+
+
+class WriteBehindBuffer:
+    """
+    Collects rows in memory and writes them with one multi-row INSERT when
+    `flush_rows` are pending or every `flush_interval` seconds.
+
+    Rows stay visible through `pending()` until their INSERT has committed, so
+    readers that check the buffer before querying the database never miss a
+    write (they may see a row twice and must de-duplicate).
+
+    After `max_retries` failed flushes the batch is written row by row so rows the
+    database rejects can be dropped (and logged) instead of blocking later writes.
+    At most `max_rows` rows are held: `add` waits for a flush past that, and drops
+    the oldest rows if the database still cannot take them.
+    """
+    def __init__(
+        self,
+        insert,
+        flush_rows: int,
+        flush_interval: float,
+        name: str = "buffer",
+        max_rows: int = 10000,
+        max_retries: int = 3
+    ):
+        self.insert = insert  # async callable taking a list of row dicts
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_retries = max_retries
+        self._failures = 0  # Consecutive failed flushes of the rows at the head
+        self._rows = []
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._flush_soon = None
+        self.logger = logging.getLogger(f"Vigil.WriteBehind.{name}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, rows: list):
+        if len(self._rows) + len(rows) > self.max_rows:
+            await self.flush()  # Backpressure: the caller waits for the database
+            async with self._lock:
+                overflow = len(self._rows) + len(rows) - self.max_rows
+                if overflow > 0:
+                    self.logger.error(f"Buffer full, dropping {overflow} oldest unwritten rows")
+                    del self._rows[:overflow]
+        self._rows.extend(rows)
+        if len(self._rows) >= self.flush_rows and (self._flush_soon is None or self._flush_soon.done()):
+            self._flush_soon = asyncio.create_task(self.flush())
+
+    def pending(self) -> list:
+        """Rows not yet committed to the database (including any being flushed)."""
+        return list(self._rows)
+
+    async def flush(self):
+        async with self._lock:
+            rows = list(self._rows)
+            if not rows:
+                return
+            try:
+                await self.insert(rows)
+                done = len(rows)
+            except Exception as e:
+                self._failures += 1
+                if self._failures < self.max_retries:
+                    self.logger.warning(f"Flush of {len(rows)} rows failed, will retry: {e}")
+                    return
+                self.logger.error(f"Flush of {len(rows)} rows failed {self._failures} times, writing rows one by one: {e}")
+                done = await self._insert_each(rows)
+            if done == len(rows):
+                self._failures = 0
+            # Rows added during the INSERT were appended after the snapshot
+            del self._rows[:done]
+
+    async def _insert_each(self, rows: list) -> int:
+        """
+        Insert rows individually, dropping those the database rejects. Stops at the
+        first other failure (e.g. the database is unreachable) and returns how many
+        leading rows were written or dropped.
+        """
+        for i, row in enumerate(rows):
+            try:
+                await self.insert([row])
+            except BAD_ROW_ERRORS as e:
+                self.logger.error(f"Dropping row rejected by the database: {e}")
+            except Exception as e:
+                self.logger.error(f"Row-by-row flush stopped after {i} rows: {e}")
+                return i
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self):
+        """Stop the periodic flusher and write out everything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _ in range(self.max_retries + 1):
+            await self.flush()
+            if not self._rows:
+                return
+        self.logger.error(f"{len(self._rows)} buffered rows could not be written before shutdown")
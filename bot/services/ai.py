@@ -3,8 +3,18 @@ from config import settings
 import json
 import logging
 import asyncio
+import httpx
 from anthropic import APIError
-from requests.exceptions import Timeout
+from bot.services.cache import DecisionCache
+from bot.services.scheduler import LLMScheduler, INTERACTIVE, ROUTING, BACKGROUND
+from bot.services.resilience import ResilienceLayer, CircuitOpenError, is_retryable
+from bot.services.prefilter import PreClassifier
+
+FAST_MODEL = "claude-3-haiku-20240307"
+REPLY_MODEL = "claude-3-sonnet-20240229"
+
+# Used when the routing call fails: answer from the model alone, store nothing
+DEFAULT_ROUTE = {"search": False, "recall": False, "save": False, "type": "fact", "importance": 1}
 
 
 class AIService:
@@ -12,18 +22,135 @@ class AIService:
     Service for interacting with Anthropics Claude API for generating responses.
     """
     def __init__(self):
-        self.client = anthropic.Anthropic(
-            api_key=settings.ANTHROPIC_API_KEY
+        # Async client so LLM round-trips never block the discord.py event loop
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            timeout=httpx.Timeout(settings.ANTHROPIC_TIMEOUT, connect=settings.ANTHROPIC_CONNECT_TIMEOUT),
+            max_retries=0,  # Retries are handled by the resilience layer
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.ANTHROPIC_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ANTHROPIC_MAX_KEEPALIVE
+                )
+            )
         )
         self.logger = logging.getLogger("Vigil.AI")
-    
+        # Obvious cases are decided by local rules before any LLM round-trip
+        self.prefilter = PreClassifier(
+            threshold=settings.PREFILTER_THRESHOLD,
+            model_path=settings.PREFILTER_MODEL_PATH
+        )
+        # Repeat classifier questions are answered locally instead of by another round-trip
+        self.decision_cache = DecisionCache(
+            max_size=settings.DECISION_CACHE_SIZE,
+            ttls={
+                "route": settings.ROUTE_CACHE_TTL,
+                "search": settings.SEARCH_DECISION_TTL,
+                "recall": settings.RECALL_DECISION_TTL,
+                "save": settings.SAVE_DECISION_TTL,
+                "relevance": settings.RELEVANCE_DECISION_TTL
+            }
+        )
+        # Per-model rate limits and concurrency caps; replies are admitted before background work
+        self.scheduler = LLMScheduler(
+            limits={
+                FAST_MODEL: (settings.FAST_MODEL_RPM, settings.FAST_MODEL_CONCURRENCY),
+                REPLY_MODEL: (settings.REPLY_MODEL_RPM, settings.REPLY_MODEL_CONCURRENCY)
+            },
+            default_limit=(settings.FAST_MODEL_RPM, settings.FAST_MODEL_CONCURRENCY)
+        )
+        # Circuit breakers, jittered retries, hedging of fast classifier calls and Sonnet -> Haiku fallback
+        self.resilience = ResilienceLayer(
+            fallbacks={REPLY_MODEL: FAST_MODEL},
+            max_retries=settings.ANTHROPIC_MAX_RETRIES,
+            base_delay=settings.LLM_RETRY_BASE_DELAY,
+            max_delay=settings.LLM_RETRY_MAX_DELAY,
+            failure_threshold=settings.LLM_BREAKER_THRESHOLD,
+            reset_timeout=settings.LLM_BREAKER_RESET,
+            hedge_models={FAST_MODEL} if settings.LLM_HEDGING else set(),
+            hedge_percentile=settings.LLM_HEDGE_PERCENTILE
+        )
+
+    async def _create(self, timeout: float = None, priority: int = ROUTING, **kwargs):
+        """
+        Send a Messages API request through the resilience layer (retries, breakers,
+        hedging, fallback) and the scheduler, with a per-call timeout.
+        """
+        async def request(model: str):
+            async with self.scheduler.slot(model, priority):
+                return await self.client.messages.create(
+                    timeout=timeout or settings.ANTHROPIC_CLASSIFIER_TIMEOUT,
+                    **{**kwargs, "model": model}
+                )
+
+        return await self.resilience.call(kwargs["model"], request)
+
+    async def close(self):
+        """Release pooled connections held by the client."""
+        await self.client.close()
+
+    async def route_message(self, question: str) -> dict:
+        """
+        Make every routing decision for a message in a single request.
+        Returns search/recall/save flags plus the memory type and importance.
+        """
+        local = self.prefilter.route(question)
+        if local is not None:
+            return local
+
+        cached = self.decision_cache.get("route", question)
+        if cached is not None:
+            return dict(cached)
+
+        decision = dict(DEFAULT_ROUTE)
+        try:
+            response = await self._create(
+                model=FAST_MODEL,
+                max_tokens=100,
+                messages=[{
+                    "role": "user",
+                    "content": f"""Route this Discord message. Reply ONLY with JSON:
+                    {{"search": true/false, "recall": true/false, "save": true/false, "type": "preference/fact", "importance": 1-5}}
+
+                    - "search": needs current/accurate data (prices, weather, news), scientific facts,
+                      statistics, specific numbers or anything better answered by searching Google
+                    - "recall": asks about the user's own personal facts/preferences ('no' for general questions)
+                    - "save": contains a personal fact or preference about the user (e.g., favorites, important info)
+                    - "type" and "importance": how the message would be classified as a memory
+
+                    Message: '{question}'"""
+                }],
+                temperature=0
+            )
+            result = response.content[0].text.strip()
+            result = result.replace("```json", "").replace("```", "").strip()
+            parsed = json.loads(result)
+            decision.update({
+                "search": bool(parsed.get("search", False)),
+                "recall": bool(parsed.get("recall", False)),
+                "save": bool(parsed.get("save", False)),
+                "type": parsed.get("type") or "fact",
+                "importance": min(max(int(parsed.get("importance", 1)), 1), 5)
+            })
+            print(f"Routing decision for '{question}': {decision}")
+            self.decision_cache.set("route", question, value=dict(decision))
+        except Exception as e:
+            self.logger.error(f"Routing error: {e}")
+        return decision
+
     async def should_search_web(self, question: str) -> bool:
         """
         Determine whether a query requires a web search.
         """
+        local = self.prefilter.decide("search", question)
+        if local is not None:
+            return local
+        cached = self.decision_cache.get("search", question)
+        if cached is not None:
+            return cached
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = await self._create(
+                model=FAST_MODEL,
                 max_tokens=100,
                 messages=[{
                     "role": "user",
@@ -41,6 +168,7 @@ class AIService:
             )
             answer = response.content[0].text.strip().lower()
             print(f"Web search classification for '{question}': {answer}")
+            self.decision_cache.set("search", question, value=answer == "yes")
             return answer == "yes"
         except Exception as e:
             print(f"Error checking if web search is required: {e}")
@@ -50,9 +178,13 @@ class AIService:
         """
         Classify whether user input should be stored in long-term memory.
         """
+        cached = self.decision_cache.get("save", content)
+        if cached is not None:
+            return cached
         try:
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
+            response = await self._create(
+                model=REPLY_MODEL,
+                priority=BACKGROUND,
                 max_tokens=100,
                 messages=[{
                     "role": "user",
@@ -62,6 +194,7 @@ class AIService:
             )
             answer = response.content[0].text.strip().lower()
             print(f"Long-term memory classification for '{content}': {answer}")
+            self.decision_cache.set("save", content, value=answer == "yes")
             return answer == "yes"
         except Exception as e:
             print(f"Error checking long-term memory classification: {e}")
@@ -70,8 +203,8 @@ class AIService:
     async def extract_value(self, prompt: str) -> str:
         """Extract specific numerical data from text."""
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",  # Faster model for extraction
+            response = await self._create(
+                model=FAST_MODEL,  # Faster model for extraction
                 max_tokens=100,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0
@@ -81,70 +214,108 @@ class AIService:
             print(f"Extraction error: {e}")
             return None
 
-    async def generate_response(self, messages, personality_prompt: str):
+    async def generate_response(self, messages, personality_prompt):
         """
         Generate a conversational response with Vigil's personality.
+        `personality_prompt` is a system string or a list of system blocks (see ContextBuilder).
         """
         try:
             # Filter out any system messages from the input
             filtered_messages = [msg for msg in messages if msg["role"] != "system"]
             
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
+            response = await self._create(
+                model=REPLY_MODEL,
+                priority=INTERACTIVE,
                 max_tokens=1024,
                 messages=filtered_messages,
                 system=personality_prompt,  # This is the correct way to set system message
-                temperature=0.7
+                temperature=0.7,
+                timeout=settings.ANTHROPIC_TIMEOUT
             )
             
+            self.logger.debug(f"Reply usage: {response.usage}")
             return response.content[0].text.strip()
         except Exception as e:
             print(f"Error in AI response generation: {e}")
             return "*I couldn't process that, try again later!*"
 
+    async def stream_response(self, messages, personality_prompt):
+        """
+        Stream a conversational response as text deltas.
+        Yields the usual fallback text if the stream fails transiently before producing
+        anything; other errors (e.g. a rejected request) are raised to the caller.
+        """
+        produced = False
+        filtered_messages = [msg for msg in messages if msg["role"] != "system"]
+        # Falls back to the fast model if the reply model's breaker is open or the stream fails early and transiently
+        for model in self.resilience.candidates(REPLY_MODEL):
+            try:
+                async with self.scheduler.slot(model, INTERACTIVE):
+                    async with self.client.messages.stream(
+                        model=model,
+                        max_tokens=1024,
+                        messages=filtered_messages,
+                        system=personality_prompt,
+                        temperature=0.7,
+                        timeout=settings.ANTHROPIC_TIMEOUT
+                    ) as stream:
+                        async for text in stream.text_stream:
+                            produced = True
+                            yield text
+                self.resilience.record_success(model)
+                return
+            except Exception as e:
+                self.resilience.record_failure(model, e)
+                if produced:
+                    print(f"Error in AI response streaming ({model}): {e}")
+                    return
+                if not is_retryable(e):
+                    self.logger.error(f"AI response stream rejected ({model}): {e}")
+                    raise
+                print(f"Error in AI response streaming ({model}): {e}")
+        yield "*I couldn't process that, try again later!*"
+
     async def classify_memory(self, content: str) -> dict:
-        """Classify memory type and importance with error handling"""
-        max_retries = 3
-        for attempt in range(max_retries):
+        """Classify memory type and importance with error handling (retries come from the resilience layer)"""
+        try:
+            response = await self._create(
+                model=FAST_MODEL,
+                priority=BACKGROUND,
+                max_tokens=100,
+                messages=[{
+                    "role": "user",
+                    "content": f"Classify this memory. Format: JSON with 'type' (preference/fact) and 'importance' (1-5): '{content}'"
+                }],
+                temperature=0
+            )
+            if not response.content:
+                raise ValueError("Empty response")
+            # Extract classification from response
+            result = response.content[0].text.strip()
             try:
-                response = self.client.messages.create(
-                    model="claude-3-haiku-20240307",
-                    max_tokens=100,
-                    messages=[{
-                        "role": "user",
-                        "content": f"Classify this memory. Format: JSON with 'type' (preference/fact) and 'importance' (1-5): '{content}'"
-                    }],
-                    temperature=0,
-                    timeout=10.0  # Add timeout
-                )
-                # Rest of method remains same
-                # Add retry on empty response
-                if not response.content:
-                    raise ValueError("Empty response")
-                # Extract classification from response
-                result = response.content[0].text.strip()
-                try:
-                    # Clean up the response to ensure it's valid JSON
-                    result = result.replace("```json", "").replace("```", "").strip()
-                    classification = json.loads(result)
-                    return {
-                        "type": classification.get("type", "fact"),
-                        "importance": min(max(classification.get("importance", 1), 1), 5)
-                    }
-                except json.JSONDecodeError:
-                    return {"type": "fact", "importance": 1}
-            except (APIError, Timeout) as e:
-                if attempt == max_retries - 1:
-                    return {"type": "fact", "importance": 1}
-                await asyncio.sleep(1.5 ** attempt)
+                # Clean up the response to ensure it's valid JSON
+                result = result.replace("```json", "").replace("```", "").strip()
+                classification = json.loads(result)
+                return {
+                    "type": classification.get("type", "fact"),
+                    "importance": min(max(classification.get("importance", 1), 1), 5)
+                }
+            except json.JSONDecodeError:
+                return {"type": "fact", "importance": 1}
+        except (APIError, CircuitOpenError, ValueError) as e:
+            self.logger.error(f"Memory classification error: {e}")
+            return {"type": "fact", "importance": 1}
 
     async def check_memory_relevance(self, memory: str, current_context: str) -> bool:
         """
         Check if a memory is relevant to the current conversation context.
         """
+        cached = self.decision_cache.get("relevance", memory, current_context)
+        if cached is not None:
+            return cached
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = await self._create(
+                model=FAST_MODEL,
                 max_tokens=100,
                 messages=[{
                     "role": "user",
@@ -163,6 +334,7 @@ class AIService:
             )
             answer = response.content[0].text.strip().lower()
             self.logger.debug(f"Memory relevance check - Memory: '{memory}', Context: '{current_context}', Result: {answer}")
+            self.decision_cache.set("relevance", memory, current_context, value=answer == "yes")
             return answer == "yes"
         except Exception as e:
             self.logger.error(f"Error checking memory relevance: {e}")
@@ -174,8 +346,8 @@ class AIService:
         """Format memories into a context string for response generation."""
         try:
             memories_text = "\n".join([f"- {m}" for m in memories])
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = await self._create(
+                model=FAST_MODEL,
                 max_tokens=150,
                 messages=[{
                     "role": "user",
@@ -200,8 +372,8 @@ class AIService:
     async def get_semantic_similarity(self, text1: str, text2: str) -> float:
         """Get semantic similarity score between two texts (0-1)"""
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = await self._create(
+                model=FAST_MODEL,
                 max_tokens=100,
                 messages=[{
                     "role": "user",
@@ -225,8 +397,8 @@ class AIService:
     async def validate_memory_match(self, query: str, memory: str) -> float:
         """Strict validation of memory matches to prevent hallucinations"""
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = await self._create(
+                model=FAST_MODEL,
                 max_tokens=100,
                 messages=[{
                     "role": "user",
@@ -243,8 +415,8 @@ class AIService:
     async def get_memory_relevance_score(self, query: str, memory: str) -> float:
         """Get combined relevance score (0-1) with single API call"""
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = await self._create(
+                model=FAST_MODEL,
                 max_tokens=100,
                 messages=[{
                     "role": "user",
@@ -271,11 +443,68 @@ class AIService:
             self.logger.error(f"Scoring error: {e}")
             return 0
 
+    async def score_memories(self, query: str, memories: list) -> list:
+        """
+        Score many memories (0-1) against one query.
+        Memories are sent in chunks of MEMORY_SCORE_BATCH_SIZE, with at most
+        MEMORY_SCORE_CONCURRENCY chunk requests in flight. Scores keep input order.
+        """
+        if not memories:
+            return []
+
+        batch_size = max(settings.MEMORY_SCORE_BATCH_SIZE, 1)
+        chunks = [memories[i:i + batch_size] for i in range(0, len(memories), batch_size)]
+        semaphore = asyncio.Semaphore(settings.MEMORY_SCORE_CONCURRENCY)
+
+        async def score_chunk(chunk: list) -> list:
+            memories_text = "\n".join(f"{i}. {m}" for i, m in enumerate(chunk, 1))
+            async with semaphore:
+                try:
+                    response = await self._create(
+                        model=FAST_MODEL,
+                        max_tokens=20 + 8 * len(chunk),
+                        messages=[{
+                            "role": "user",
+                            "content": f"""Score each numbered memory in relation to the query. Reply ONLY with a JSON
+                            list of {len(chunk)} numbers (0-1), one per memory, in the same order.
+
+                            Query: {query}
+
+                            Memories:
+                            {memories_text}
+
+                            Scoring rules:
+                            - 1.0 if memory contains direct user statement matching query
+                            - 0.8 if memory contains related personal fact
+                            - 0.5 if indirect connection
+                            - 0.0 if irrelevant"""
+                        }],
+                        temperature=0
+                    )
+                    result = response.content[0].text.strip()
+                    result = result.replace("```json", "").replace("```", "").strip()
+                    scores = [min(max(float(score), 0), 1) for score in json.loads(result)]
+                    if len(scores) != len(chunk):
+                        raise ValueError(f"Expected {len(chunk)} scores, got {len(scores)}")
+                    return scores
+                except Exception as e:
+                    self.logger.error(f"Batch scoring error: {e}")
+                    return [0] * len(chunk)
+
+        results = await asyncio.gather(*(score_chunk(chunk) for chunk in chunks))
+        return [score for chunk_scores in results for score in chunk_scores]
+
     async def needs_memory_recall(self, query: str) -> bool:
         """Determine if the query requires memory recall."""
+        local = self.prefilter.decide("recall", query)
+        if local is not None:
+            return local
+        cached = self.decision_cache.get("recall", query)
+        if cached is not None:
+            return cached
         try:
-            response = self.client.messages.create(
-                model="claude-3-haiku-20240307",
+            response = await self._create(
+                model=FAST_MODEL,
                 max_tokens=100,
                 messages=[{
                     "role": "user",
@@ -288,7 +517,9 @@ class AIService:
                 }],
                 temperature=0
             )
-            return response.content[0].text.strip().lower() == "yes"
+            answer = response.content[0].text.strip().lower() == "yes"
+            self.decision_cache.set("recall", query, value=answer)
+            return answer
         except Exception as e:
             self.logger.error(f"Recall check error: {e}")
             return False
\ No newline at end of file
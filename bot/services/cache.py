@@ -0,0 +1,167 @@
+import asyncio
+import re
+import time
+from collections import Counter, OrderedDict
+
+
+class DecisionCache:
+    """
+    Bounded TTL/LRU cache for short LLM classifier answers (yes/no, routing JSON).
+    Entries are keyed on (classifier, normalized text) and expire per classifier.
+    """
+    def __init__(self, max_size: int, ttls: dict, default_ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = Counter()
+        self.misses = Counter()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        text = re.sub(r"\s+", " ", (text or "").lower()).strip()
+        return text.rstrip("?!.,;: ")
+
+    def _key(self, namespace: str, parts) -> tuple:
+        return (namespace, *(self.normalize(p) for p in parts))
+
+    def get(self, namespace: str, *parts):
+        """Return the cached value, or None on a miss or expired entry."""
+        key = self._key(namespace, parts)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits[namespace] += 1
+                return value
+            del self._entries[key]
+        self.misses[namespace] += 1
+        return None
+
+    def set(self, namespace: str, *parts, value):
+        """Store a value, evicting the least recently used entries past max_size."""
+        key = self._key(namespace, parts)
+        ttl = self.ttls.get(namespace, self.default_ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters per classifier plus current size."""
+        namespaces = set(self.hits) | set(self.misses)
+        return {
+            "size": len(self._entries),
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "by_classifier": {
+                ns: {"hits": self.hits[ns], "misses": self.misses[ns]}
+                for ns in sorted(namespaces)
+            }
+        }
+
+
+class ResultCache:
+    """
+    Bounded cache of slow external results (web search answers, generated images)
+    keyed on the normalized query.
+
+    Answers younger than `ttl` are served as-is. Up to `stale_ttl` beyond that they
+    are still served immediately while one background request refreshes them
+    (stale-while-revalidate). Concurrent lookups for the same query share a single
+    in-flight request (single-flight), which is cancelled once every caller waiting
+    on it has been cancelled. Only answers passing `cacheable` are stored (by
+    default anything but None, which marks a failed lookup).
+    """
+    def __init__(self, max_size: int, ttl: float, stale_ttl: float = 0.0, cacheable=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cacheable = cacheable or (lambda answer: answer is not None)
+        self._entries = OrderedDict()  # query -> (fetched_at, answer)
+        self._inflight = {}  # query -> asyncio.Task
+        self._waiters = Counter()  # query -> callers awaiting the in-flight task
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_fetch(self, query: str, fetch):
+        """Return the answer for query, calling `await fetch(query)` only when needed."""
+        key = DecisionCache.normalize(query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, answer = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return answer
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._fetch_once(key, query, fetch)  # Refresh in the background
+                return answer
+            del self._entries[key]
+
+        if key in self._inflight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        task = self._fetch_once(key, query, fetch)
+        self._waiters[key] += 1
+        try:
+            # Shielded so one caller giving up does not cancel the request others await
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1:
+                task.cancel()  # Nobody else wants the answer (e.g. a dropped speculative search)
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def __contains__(self, query: str) -> bool:
+        """Whether a lookup for query would be served without a new request."""
+        key = DecisionCache.normalize(query)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl + self.stale_ttl:
+            return True
+        return key in self._inflight
+
+    def _fetch_once(self, key: str, query: str, fetch) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, query, fetch))
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: str, query: str, fetch):
+        try:
+            answer = await fetch(query)
+            if self.cacheable(answer):
+                self._entries[key] = (time.monotonic(), answer)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            elif key in self._entries:
+                answer = self._entries[key][1]  # Keep serving the stale answer if a refresh fails
+            return answer
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
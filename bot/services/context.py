@@ -0,0 +1,84 @@
+import logging
+from config import settings
+
+logger = logging.getLogger("Vigil.Context")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class ContextBuilder:
+    """
+    Assembles the prompt for a reply under an explicit input-token budget.
+
+    The personality prompt and the current question are always included. Long-term
+    memories come next, then short-term history from newest to oldest in whole
+    user/assistant exchanges until the budget runs out.
+
+    No block is marked for prompt caching: the personality alone is far below the
+    provider's minimum cacheable prefix, and the memories after it are picked per
+    question, so a longer prefix would rarely repeat.
+    """
+    def __init__(self, personality: str, token_budget: int = None):
+        self.personality = personality
+        self.token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+
+    def build(self, question: str, long_term: list = None, short_term: list = None, user_content: str = None) -> dict:
+        """
+        Return {"system": [...], "messages": [...], "tokens": {...}}.
+        `user_content` replaces the final user message (e.g. question plus search results).
+        """
+        user_content = user_content or question
+        tokens = {
+            "personality": estimate_tokens(self.personality),
+            "question": estimate_tokens(user_content),
+            "memories": 0,
+            "history": 0,
+            "dropped_memories": 0,
+            "dropped_history": 0
+        }
+        remaining = self.token_budget - tokens["personality"] - tokens["question"]
+
+        system = [{"type": "text", "text": self.personality}]
+
+        # Long-term memories as background knowledge in the system prompt
+        kept_memories = []
+        for memory in long_term or []:
+            cost = estimate_tokens(f"- {memory}\n")
+            if cost > remaining:
+                tokens["dropped_memories"] += 1
+                continue
+            kept_memories.append(memory)
+            tokens["memories"] += cost
+            remaining -= cost
+        if kept_memories:
+            system.append({
+                "type": "text",
+                "text": "Relevant memories:\n" + "\n".join(f"- {m}" for m in kept_memories)
+            })
+
+        # Short-term history, newest exchanges first, kept whole and contiguous
+        history = []
+        newest_first = list(reversed(short_term or []))
+        for index, exchange in enumerate(newest_first):
+            cost = estimate_tokens(exchange["user"]) + estimate_tokens(exchange["assistant"])
+            if cost > remaining:
+                # Skipping one exchange but keeping older ones would leave a gap in the conversation
+                tokens["dropped_history"] = len(newest_first) - index
+                break
+            history[:0] = [
+                {"role": "user", "content": exchange["user"]},
+                {"role": "assistant", "content": exchange["assistant"]}
+            ]
+            tokens["history"] += cost
+            remaining -= cost
+
+        tokens["total"] = tokens["personality"] + tokens["question"] + tokens["memories"] + tokens["history"]
+        logger.info(f"Assembled context: {tokens}")
+        return {
+            "system": system,
+            "messages": [*history, {"role": "user", "content": user_content}],
+            "tokens": tokens
+        }
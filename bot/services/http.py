@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit
+import httpx
+from config import settings
+
+logger = logging.getLogger("Vigil.HTTP")
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (optional: pip install httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+
+class HttpTransport:
+    """
+    Shared outbound HTTP client for every integration (Perplexity, Leonardo, ...).
+
+    One pooled httpx.AsyncClient keeps connections alive between requests, so
+    each call skips the TCP and TLS handshakes. Per-host semaphores keep one
+    slow API from taking every pooled connection. Owned by VigilBot and closed
+    on shutdown.
+    """
+    def __init__(self, per_host_limit: int = None):
+        self.per_host_limit = per_host_limit or settings.HTTP_PER_HOST_CONNECTIONS
+        http2 = settings.HTTP2
+        if http2 and not _http2_available():
+            logger.warning("HTTP2 is enabled but the h2 package is missing; using HTTP/1.1")
+            http2 = False
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        self._hosts = {}  # host -> asyncio.Semaphore
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._hosts[host]
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the shared pool; kwargs are passed to httpx."""
+        async with self._host_slot(url):
+            return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        """Close pooled connections on shutdown."""
+        await self.client.aclose()
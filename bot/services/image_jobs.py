@@ -0,0 +1,309 @@
+import asyncio
+import logging
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from bot.services.cache import ResultCache
+from config import settings
+
+LEONARDO_API = "https://cloud.leonardo.ai/api/rest/v1"
+LEONARDO_MODEL_ID = "de7d3faf-762f-48e0-b3b7-9d0ac3a3fcf3"
+
+
+class _Job:
+    __slots__ = ("generation_id", "future", "deadline", "next_poll", "polls")
+
+    def __init__(self, generation_id: str, future: asyncio.Future, now: float):
+        self.generation_id = generation_id
+        self.future = future
+        self.deadline = now + settings.IMAGE_JOB_TIMEOUT
+        self.next_poll = now + settings.IMAGE_POLL_INITIAL
+        self.polls = 0
+
+
+class QuotaExceededError(Exception):
+    """The user already has as many image requests waiting as allowed."""
+
+
+class _Waiter:
+    __slots__ = ("user_id", "future")
+
+    def __init__(self, user_id: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.future = future
+
+
+class FairJobQueue:
+    """
+    Concurrency slots for image jobs with per-user and per-guild quotas.
+
+    A job runs only while the total, its guild's and its user's running counts are
+    under their limits. Waiting jobs are queued per guild and free slots are handed
+    out round-robin across guilds, so one busy server cannot starve the others.
+    Direct messages count as a guild of their own per user.
+    """
+    def __init__(self, total: int, per_guild: int, per_user: int, max_queued_per_user: int):
+        self.total = total
+        self.per_guild = per_guild
+        self.per_user = per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.running = 0
+        self.guild_running = Counter()
+        self.user_running = Counter()
+        self.user_queued = Counter()
+        self._queues = OrderedDict()  # guild key -> deque of _Waiter, in round-robin order
+
+    @staticmethod
+    def _guild_key(user_id: int, guild_id: int):
+        return guild_id if guild_id else ("dm", user_id)
+
+    def can_enqueue(self, user_id: int) -> bool:
+        return self.user_queued[user_id] < self.max_queued_per_user
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, guild_id: int):
+        """Wait for a fair turn to run one job. Raises QuotaExceededError if the user's queue is full."""
+        if not self.can_enqueue(user_id):
+            raise QuotaExceededError(f"user {user_id} has {self.user_queued[user_id]} image jobs waiting")
+        guild = self._guild_key(user_id, guild_id)
+        waiter = _Waiter(user_id, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(guild, deque()).append(waiter)
+        self.user_queued[user_id] += 1
+        try:
+            self._dispatch()
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(user_id, guild)  # Granted just as the caller gave up
+            else:
+                self._discard(guild, waiter)
+            raise
+        finally:
+            self.user_queued[user_id] -= 1
+            if not self.user_queued[user_id]:
+                del self.user_queued[user_id]
+        try:
+            yield
+        finally:
+            self._release(user_id, guild)
+
+    def _dispatch(self):
+        """Grant free slots, one per guild in turn."""
+        granted = True
+        while granted and self.running < self.total:
+            granted = False
+            for guild, queue in list(self._queues.items()):
+                # Callers cancelled while queued leave done futures behind until their cleanup runs
+                for stale in [w for w in queue if w.future.done()]:
+                    queue.remove(stale)
+                if not queue:
+                    del self._queues[guild]
+                    continue
+                if self.guild_running[guild] >= self.per_guild:
+                    continue
+                waiter = next((w for w in queue if self.user_running[w.user_id] < self.per_user), None)
+                if waiter is None:
+                    continue
+                queue.remove(waiter)
+                self.running += 1
+                self.guild_running[guild] += 1
+                self.user_running[waiter.user_id] += 1
+                waiter.future.set_result(None)
+                # The served guild goes to the back of the rotation
+                del self._queues[guild]
+                if queue:
+                    self._queues[guild] = queue
+                granted = True
+                break
+
+    def _release(self, user_id: int, guild):
+        self.running -= 1
+        self.guild_running[guild] -= 1
+        self.user_running[user_id] -= 1
+        if not self.guild_running[guild]:
+            del self.guild_running[guild]
+        if not self.user_running[user_id]:
+            del self.user_running[user_id]
+        self._dispatch()
+
+    def _discard(self, guild, waiter: _Waiter):
+        queue = self._queues.get(guild)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[guild]
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "guilds_waiting": len(self._queues)
+        }
+
+
+class ImageJobTracker:
+    """
+    Tracks every in-flight Leonardo generation from one polling task.
+
+    `generate` starts a job and waits on a per-job future. The poller checks all
+    jobs that are due in one concurrent round, then sleeps until the next one is
+    due. Each job is polled quickly at first and then backs off
+    (IMAGE_POLL_INITIAL growing by IMAGE_POLL_BACKOFF up to IMAGE_POLL_MAX), since
+    most generations finish early.
+
+    Repeated prompts are served from a result cache for IMAGE_CACHE_TTL, and a
+    prompt already being generated is joined rather than started again. New jobs
+    wait in a FairJobQueue: at most IMAGE_MAX_CONCURRENT_JOBS run at once, within
+    per-guild and per-user quotas.
+    """
+    def __init__(self, http, max_jobs: int = None):
+        self.http = http  # Shared HttpTransport
+        self.headers = {
+            "Authorization": f"Bearer {settings.LEONARDO_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        self.queue = FairJobQueue(
+            total=max_jobs or settings.IMAGE_MAX_CONCURRENT_JOBS,
+            per_guild=settings.IMAGE_GUILD_CONCURRENCY,
+            per_user=settings.IMAGE_USER_CONCURRENCY,
+            max_queued_per_user=settings.IMAGE_USER_MAX_QUEUED
+        )
+        self.results = ResultCache(
+            max_size=settings.IMAGE_CACHE_SIZE,
+            ttl=settings.IMAGE_CACHE_TTL,
+            cacheable=lambda result: result["status"] == "COMPLETE"
+        )
+        self._jobs = {}  # generation_id -> _Job
+        self._wakeup = asyncio.Event()
+        self.task = None
+        self.logger = logging.getLogger("Vigil.ImageJobs")
+
+    def start(self):
+        """Start the poller, or restart it if it died."""
+        if self.task is None or self.task.done():
+            if self.task is not None:
+                self.logger.warning("Image job poller was not running, restarting it")
+            self.task = asyncio.create_task(self._run())
+            self.task.add_done_callback(self._poller_done)
+
+    def _poller_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error("Image job poller stopped", exc_info=task.exception())
+
+    async def generate(self, prompt: str, user_id: int, guild_id: int = None, width: int = 512, height: int = 512) -> dict:
+        """
+        Generate one image (or reuse a recent or in-flight one for the same prompt)
+        and wait for it. Returns a dict with "status" (COMPLETE, FAILED, TIMEOUT,
+        START_FAILED, NO_ID or QUOTA), plus "generation_id" and "url" when known.
+        """
+        key = f"{width}x{height} {prompt}"
+        quota_failure = {"status": "QUOTA", "generation_id": None, "url": None}
+
+        async def run_job(_):
+            try:
+                return await self._generate(prompt, user_id, guild_id, width, height)
+            except QuotaExceededError:
+                return {**quota_failure, "user_id": user_id}
+
+        while True:
+            # Quota applies only to callers who would start a job; joining or reusing one is free
+            if key not in self.results and not self.queue.can_enqueue(user_id):
+                return quota_failure
+            result = await self.results.get_or_fetch(key, run_job)
+            if result["status"] != "QUOTA" or result.get("user_id") == user_id:
+                return result
+            # Joined a flight that failed on its starter's quota; retry on this caller's own quota
+
+    async def _generate(self, prompt: str, user_id: int, guild_id: int, width: int, height: int) -> dict:
+        async with self.queue.slot(user_id, guild_id):
+            response = await self.http.post(
+                f"{LEONARDO_API}/generations",
+                json={
+                    "height": height,
+                    "modelId": LEONARDO_MODEL_ID,
+                    "prompt": prompt,
+                    "width": width,
+                    "num_images": 1
+                },
+                headers=self.headers
+            )
+            if response.status_code != 200:
+                return {"status": "START_FAILED", "generation_id": None, "url": None}
+
+            generation_id = response.json().get('sdGenerationJob', {}).get('generationId')
+            if not generation_id:
+                return {"status": "NO_ID", "generation_id": None, "url": None}
+
+            loop = asyncio.get_running_loop()
+            job = _Job(generation_id, loop.create_future(), loop.time())
+            self._jobs[generation_id] = job
+            self.start()
+            self._wakeup.set()
+            try:
+                return await job.future
+            finally:
+                self._jobs.pop(generation_id, None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            due = [job for job in self._jobs.values() if job.next_poll <= now and not job.future.done()]
+            if due:
+                await asyncio.gather(*(self._poll(job) for job in due))
+                continue
+
+            pending = [job.next_poll for job in self._jobs.values() if not job.future.done()]
+            self._wakeup.clear()
+            try:
+                # Sleep until the next job is due, or until a new job arrives
+                timeout = max(0.0, min(pending) - now) if pending else None
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, job: _Job):
+        loop = asyncio.get_running_loop()
+        try:
+            response = await self.http.get(f"{LEONARDO_API}/generations/{job.generation_id}", headers=self.headers)
+            generation = response.json().get("generations_by_pk", {}) or {}
+            status = generation.get("status")
+
+            if status == "FAILED":
+                self._resolve(job, "FAILED")
+                return
+            if status == "COMPLETE":
+                images = generation.get("generated_images", [])
+                image_url = images[0].get('url') if images else None
+                if image_url:
+                    self._resolve(job, "COMPLETE", image_url)
+                    return
+        except Exception as e:
+            self.logger.warning(f"Status check error for {job.generation_id}: {e}")
+
+        now = loop.time()
+        if now >= job.deadline:
+            self._resolve(job, "TIMEOUT")
+            return
+        job.polls += 1
+        interval = min(settings.IMAGE_POLL_MAX, settings.IMAGE_POLL_INITIAL * settings.IMAGE_POLL_BACKOFF ** job.polls)
+        job.next_poll = min(now + interval, job.deadline)
+
+    @staticmethod
+    def _resolve(job: _Job, status: str, url: str = None):
+        if not job.future.done():
+            job.future.set_result({"status": status, "generation_id": job.generation_id, "url": url})
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._jobs), "queue": self.queue.stats(), "cache": self.results.stats()}
+
+    async def stop(self):
+        """Stop polling and release anyone still waiting on a job."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for job in list(self._jobs.values()):
+            self._resolve(job, "TIMEOUT")
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from config import settings
+
+
+class MemoryIngestionWorker:
+    """
+    Bounded background queue that stores long-term memory off the reply path.
+
+    Short-term memory is written by the caller (it only touches the in-memory write
+    buffer). Each submitted exchange is saved to long-term memory when the routing
+    decision (or a background classifier) says it is worth keeping. Exchanges are
+    processed in batches: missing classifications run concurrently and each batch
+    is stored with one multi-row insert.
+    """
+    def __init__(self, convo_manager, max_queue: int = None, batch_size: int = None, batch_wait: float = None):
+        self.convo_manager = convo_manager
+        self.queue = asyncio.Queue(maxsize=max_queue or settings.MEMORY_QUEUE_SIZE)
+        self.batch_size = batch_size or settings.MEMORY_BATCH_SIZE
+        self.batch_wait = batch_wait if batch_wait is not None else settings.MEMORY_BATCH_WAIT
+        self.task = None
+        self.logger = logging.getLogger("Vigil.MemoryWorker")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def submit(self, user_id: int, server_id: int, question: str, response: str, route: dict = None):
+        """
+        Queue an exchange for ingestion. Waits only if the queue is full.
+        `route` is the AIService.route_message decision; without it the worker classifies.
+        """
+        await self.queue.put({
+            "user_id": user_id,
+            "server_id": server_id,
+            "question": question,
+            "response": response,
+            "route": route
+        })
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                # Not wait_for(queue.get()): its timeout can fire after get() took an item, losing it.
+                # A get() task still pending when cancelled has not taken anything.
+                getter = asyncio.ensure_future(self.queue.get())
+                try:
+                    await asyncio.wait({getter}, timeout=remaining)
+                finally:
+                    if not getter.done():
+                        getter.cancel()
+                if not getter.done():
+                    break  # Timed out
+                batch.append(getter.result())
+            try:
+                await self._ingest(batch)
+            except Exception as e:
+                self.logger.error(f"Memory ingestion error ({len(batch)} exchanges dropped): {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _ingest(self, batch: list):
+        ai_service = self.convo_manager.ai_service
+
+        async def resolve(item):
+            content = f"User stated: {item['question']}"  # Store direct user statement
+            classification = item["route"]
+            if classification is None:
+                if not await ai_service.should_save_to_long_term(item["question"]):
+                    return None
+                classification = await ai_service.classify_memory(content)
+            elif not classification.get("save"):
+                return None
+            return {
+                "user_id": item["user_id"],
+                "server_id": item["server_id"],
+                "content": content,
+                "classification": classification
+            }
+
+        memories = [m for m in await asyncio.gather(*(resolve(item) for item in batch)) if m]
+        if memories:
+            await self.convo_manager.save_long_term_batch(memories)
+        self.logger.debug(f"Ingested {len(batch)} exchanges, {len(memories)} long-term memories")
+
+    async def stop(self, timeout: float = None):
+        """Drain queued exchanges (up to timeout seconds), then stop the worker."""
+        if self.task is None:
+            return
+        timeout = timeout if timeout is not None else settings.MEMORY_DRAIN_TIMEOUT
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Memory queue drain timed out with {self.queue.qsize()} exchanges pending")
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
@@ -0,0 +1,127 @@
+import logging
+import re
+from collections import Counter
+import numpy as np
+from bot.services import vectors
+
+logger = logging.getLogger("Vigil.Prefilter")
+
+# Short greetings/reactions: nothing to search, recall or store
+SMALL_TALK = re.compile(
+    r"^(hi+|hey+|hello+|yo+|sup|wassup|gm|gn|good (morning|night|evening)|lol+|lmao+|haha+|hehe+|xd|"
+    r"thanks?( you)?|ty|thx|ok(ay)?|k|nice|cool|wow|bye|cya|brb|nvm|same|yes|no|yep|nope)"
+    r"( vigil)?[\s!?.,]*$"
+)
+SEARCH_HINTS = re.compile(
+    r"\b(weather|forecast|temperature in|price of|stock|market cap|exchange rate|"
+    r"news|headlines|latest|score of|scores|who won|election|results? of|"
+    r"btc|eth|bitcoin|ethereum|solana|dogecoin|nasdaq|s&p|dow jones)\b"
+)
+# Question forms only: "my name is ..." or "remember that my ..." are statements to save
+RECALL_HINTS = re.compile(
+    r"\b(do you remember|remember (when|what)|what('?s| is| are| was) my|what did i (say|tell|mention)|"
+    r"did i (tell|mention)|do you know my|who am i)\b"
+)
+FIRST_PERSON = re.compile(r"\b(i|i'm|im|i've|my|me|mine|myself)\b")
+
+
+class PreClassifier:
+    """
+    Local fast path for routing decisions ("search", "recall", "save").
+
+    Keyword/regex rules answer obvious cases; an optional tiny logistic model over
+    the local hashing embeddings covers the rest. Anything below the confidence
+    threshold returns None so the caller defers to the LLM.
+    """
+    def __init__(self, threshold: float, model_path: str = None):
+        self.threshold = threshold
+        self.model = self._load_model(model_path) if model_path else {}
+        self.answered = Counter()
+        self.deferred = Counter()
+        self.llm_calls_saved = 0
+
+    @staticmethod
+    def _load_model(path: str) -> dict:
+        """Load {decision: (weights, bias)} from an .npz with <decision>_w/<decision>_b arrays."""
+        try:
+            data = np.load(path)
+            return {
+                name: (data[f"{name}_w"].astype(np.float32), float(data[f"{name}_b"]))
+                for name in ("search", "recall", "save") if f"{name}_w" in data
+            }
+        except Exception as e:
+            logger.error(f"Could not load local routing model from {path}: {e}")
+            return {}
+
+    def _rules(self, text: str) -> dict:
+        """Return {decision: (answer, confidence)} for every decision the rules can make."""
+        if SMALL_TALK.match(text):
+            return {"search": (False, 0.97), "recall": (False, 0.97), "save": (False, 0.97)}
+
+        first_person = bool(FIRST_PERSON.search(text))
+        scores = {}
+        if RECALL_HINTS.search(text):
+            scores["recall"] = (True, 0.92)
+            scores["search"] = (False, 0.9)
+        elif SEARCH_HINTS.search(text):
+            scores["search"] = (True, 0.92)
+            if not first_person:
+                scores["recall"] = (False, 0.9)
+                scores["save"] = (False, 0.9)
+        elif not first_person:
+            # No personal reference: nothing to recall or store
+            scores["recall"] = (False, 0.9)
+            scores["save"] = (False, 0.9)
+        return scores
+
+    def _score(self, decision: str, text: str):
+        answer, confidence = self._rules(text).get(decision, (None, 0.0))
+        if confidence < self.threshold and decision in self.model:
+            weights, bias = self.model[decision]
+            features = vectors.encode(text, weights.shape[0])
+            probability = 1.0 / (1.0 + np.exp(-(float(weights @ features) + bias)))
+            answer, confidence = probability >= 0.5, max(probability, 1 - probability)
+        return answer, confidence
+
+    def decide(self, decision: str, text: str):
+        """Return True/False when confident enough, otherwise None (ask the LLM)."""
+        answer, confidence = self._score(decision, self._normalize(text))
+        if answer is None or confidence < self.threshold:
+            self.deferred[decision] += 1
+            return None
+        self.answered[decision] += 1
+        self.llm_calls_saved += 1
+        return bool(answer)
+
+    def leans(self, decision: str, text: str) -> bool:
+        """True if local signals point to a yes, however weakly (not counted in stats)."""
+        answer, _ = self._score(decision, self._normalize(text))
+        return bool(answer)
+
+    def route(self, text: str):
+        """Return a full routing decision if every part is confident, otherwise None."""
+        text = self._normalize(text)
+        decision = {}
+        for name in ("search", "recall", "save"):
+            answer, confidence = self._score(name, text)
+            if answer is None or confidence < self.threshold:
+                self.deferred["route"] += 1
+                return None
+            decision[name] = bool(answer)
+        if decision["save"]:  # Memory type/importance still needs the LLM
+            self.deferred["route"] += 1
+            return None
+        self.answered["route"] += 1
+        self.llm_calls_saved += 1
+        return {**decision, "type": "fact", "importance": 1}
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", (text or "").lower()).strip()
+
+    def stats(self) -> dict:
+        return {
+            "answered": dict(self.answered),
+            "deferred": dict(self.deferred),
+            "llm_calls_saved": self.llm_calls_saved
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from anthropic import APIConnectionError, APIStatusError
+
+logger = logging.getLogger("Vigil.Resilience")
+
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate model's circuit breaker is open."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection problems, timeouts, rate limits and server-side errors are worth retrying."""
+    if isinstance(error, APIConnectionError):  # Includes APITimeoutError
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def retry_after(error: Exception):
+    """Seconds requested by a Retry-After header, if the error carries one."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds, then lets a single trial call through (half-open).
+    """
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        # Half-open: one trial at a time; a trial that never reported back expires
+        now = time.monotonic()
+        if self.trial_started is None or now - self.trial_started >= self.reset_timeout:
+            self.trial_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_started = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of request latencies for percentile estimates."""
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class ResilienceLayer:
+    """
+    Shared wrapper for LLM calls: per-model circuit breakers, jittered retries
+    that honor Retry-After, optional hedged requests once a call runs past a
+    latency percentile, and fallback to a cheaper model when one is unavailable.
+    """
+    def __init__(self, fallbacks: dict, max_retries: int, base_delay: float, max_delay: float,
+                 failure_threshold: int, reset_timeout: float, hedge_models: set = (), hedge_percentile: float = 95):
+        self.fallbacks = fallbacks  # model -> fallback model
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_models = set(hedge_models)
+        self.hedge_percentile = hedge_percentile
+        self._breakers = {}
+        self._latency = {}
+        self.counters = {"retries": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[model]
+
+    def candidates(self, model: str):
+        """Yield model, then its fallback, skipping any whose breaker rejects calls."""
+        for index, candidate in enumerate((model, self.fallbacks.get(model))):
+            if candidate is None:
+                continue
+            if not self.breaker(candidate).allow():
+                self.counters["rejected"] += 1
+                continue
+            if index:
+                self.counters["fallbacks"] += 1
+                logger.warning(f"Falling back from {model} to {candidate}")
+            yield candidate
+
+    def record_success(self, model: str):
+        self.breaker(model).record_success()
+
+    def record_failure(self, model: str, error: Exception):
+        # Client errors mean the service is up; only retryable errors trip the breaker
+        if is_retryable(error):
+            self.breaker(model).record_failure()
+        else:
+            self.breaker(model).record_success()
+
+    async def call(self, model: str, request):
+        """Run `await request(model)` with retries, hedging and fallback."""
+        last_error = None
+        for candidate in self.candidates(model):
+            try:
+                return await self._with_retries(candidate, request)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+        raise last_error or CircuitOpenError(f"No available model for {model}")
+
+    async def _with_retries(self, model: str, request):
+        """The breaker sees one outcome per logical call, however many attempts it took."""
+        breaker = self.breaker(model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await self._attempt(model, request)
+                breaker.record_success()
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries or not breaker.allow():
+                    self.record_failure(model, e)
+                    raise
+                self.counters["retries"] += 1
+                delay = retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))  # Full jitter
+                await asyncio.sleep(min(delay, self.max_delay))
+
+    async def _attempt(self, model: str, request):
+        tracker = self._latency.setdefault(model, LatencyTracker())
+        hedge_after = tracker.percentile(self.hedge_percentile) if model in self.hedge_models else None
+        started = time.monotonic()
+        if hedge_after is None:
+            result = await request(model)
+        else:
+            result = await self._hedged(model, request, hedge_after)
+        tracker.add(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, model: str, request, hedge_after: float):
+        """Start a duplicate request if the first is slower than hedge_after; first success wins."""
+        primary = asyncio.ensure_future(request(model))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if done:
+                return primary.result()
+            self.counters["hedges"] += 1
+            tasks.append(asyncio.ensure_future(request(model)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "breakers": {model: breaker.state for model, breaker in self._breakers.items()},
+            **self.counters
+        }
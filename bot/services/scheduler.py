@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+# Priority classes, lower runs first
+INTERACTIVE = 0  # User-facing reply generation
+ROUTING = 1  # Decisions on the reply's critical path
+BACKGROUND = 2  # Memory classification and other deferrable work
+PRIORITY_NAMES = {INTERACTIVE: "interactive", ROUTING: "routing", BACKGROUND: "background"}
+
+
+class TokenBucket:
+    """Request-rate limiter refilled continuously at rate_per_minute."""
+    def __init__(self, rate_per_minute: float, burst: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, rate_per_minute / 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class _ModelLane:
+    def __init__(self, rate_per_minute: float, concurrency: int):
+        self.bucket = TokenBucket(rate_per_minute)
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.waiters = []  # Heap of (priority, sequence, future)
+        self.timer = None
+
+
+class LLMScheduler:
+    """
+    Central admission control for LLM requests.
+
+    Each model gets a token-bucket rate limit and a concurrency cap. Requests wait
+    in a priority queue, so interactive replies are admitted before routing calls
+    and routing calls before background memory work; equal priorities are FIFO.
+    """
+    def __init__(self, limits: dict, default_limit: tuple):
+        self.limits = limits  # model -> (requests_per_minute, max_concurrency)
+        self.default_limit = default_limit
+        self._lanes = {}
+        self._sequence = itertools.count()
+        self._waits = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}  # count, total, max
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _ModelLane(*self.limits.get(model, self.default_limit))
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = ROUTING):
+        """Wait for an admission slot on model's lane and hold it for the block."""
+        lane = self._lane(model)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(lane.waiters, (priority, next(self._sequence), future))
+        queued_at = time.monotonic()
+        self._dispatch(lane)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.cancelled():  # Admitted just as the caller was cancelled
+                self._release(lane)
+            raise
+        self._record_wait(priority, time.monotonic() - queued_at)
+        try:
+            yield
+        finally:
+            self._release(lane)
+
+    def _dispatch(self, lane: _ModelLane):
+        """Admit queued requests while concurrency and rate limits allow."""
+        while lane.waiters and lane.in_flight < lane.concurrency:
+            if lane.waiters[0][2].done():  # Cancelled while queued
+                heapq.heappop(lane.waiters)
+                continue
+            delay = lane.bucket.delay()
+            if delay > 0:
+                if lane.timer is None:
+                    lane.timer = asyncio.get_running_loop().call_later(delay, self._on_timer, lane)
+                return
+            _, _, future = heapq.heappop(lane.waiters)
+            lane.bucket.consume()
+            lane.in_flight += 1
+            future.set_result(None)
+
+    def _on_timer(self, lane: _ModelLane):
+        lane.timer = None
+        self._dispatch(lane)
+
+    def _release(self, lane: _ModelLane):
+        lane.in_flight -= 1
+        self._dispatch(lane)
+
+    def _record_wait(self, priority: int, waited: float):
+        stats = self._waits.setdefault(priority, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+
+    def queue_depth(self, model: str = None) -> int:
+        """Number of requests waiting for admission (for one model or all)."""
+        if model is not None:
+            lanes = [self._lanes[model]] if model in self._lanes else []
+        else:
+            lanes = list(self._lanes.values())
+        return sum(1 for lane in lanes for _, _, future in lane.waiters if not future.done())
+
+    def stats(self) -> dict:
+        """Queue depth and in-flight count per model, plus wait times per priority class."""
+        return {
+            "models": {
+                model: {
+                    "in_flight": lane.in_flight,
+                    "queued": {
+                        PRIORITY_NAMES.get(p, str(p)): sum(
+                            1 for priority, _, future in lane.waiters if priority == p and not future.done()
+                        )
+                        for p in PRIORITY_NAMES
+                    }
+                }
+                for model, lane in self._lanes.items()
+            },
+            "wait_seconds": {
+                PRIORITY_NAMES.get(p, str(p)): {
+                    "count": count,
+                    "avg": total / count if count else 0.0,
+                    "max": longest
+                }
+                for p, (count, total, longest) in self._waits.items()
+            }
+        }
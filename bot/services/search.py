@@ -1,16 +1,30 @@
-import httpx
 import re  # For filtering specific data like the price
+from bot.services.cache import ResultCache
+from bot.services.http import HttpTransport
 from config import settings
 
 class SearchService:
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, http: HttpTransport):
+        self.http = http  # Shared pooled transport owned by VigilBot
         self.headers = {
             "Authorization": f"Bearer {settings.PERPLEXITY_API_KEY}",
             "Content-Type": "application/json"
         }
+        # Trending questions share one Perplexity call per freshness window
+        self.cache = ResultCache(
+            max_size=settings.SEARCH_CACHE_SIZE,
+            ttl=settings.SEARCH_CACHE_TTL,
+            stale_ttl=settings.SEARCH_STALE_TTL
+        )
 
     async def search_web(self, query: str):
+        """
+        Answer a web search, served from the result cache when possible.
+        Returns None if the search failed.
+        """
+        return await self.cache.get_or_fetch(query, self._search_perplexity)
+
+    async def _search_perplexity(self, query: str):
         """
         Perform a web search using Perplexity API with improved error handling.
         """
@@ -31,30 +45,29 @@ class SearchService:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.perplexity.ai/chat/completions",
-                    json=data,
-                    headers=self.headers,
-                    timeout=10.0
-                )
-                
-                if response.status_code == 204:
-                    return "I couldn't find any current information about that."
-                
-                if response.status_code != 200:
-                    print(f"Perplexity API error: {response.status_code} - {response.text}")
-                    return None
-
-                result = response.json()
-                content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-                
-                # Clean up the response
-                content = content.replace('*', '').strip()
-                if '[' in content:
-                    content = content.split('[')[0].strip()
-
-                return content
+            response = await self.http.post(
+                "https://api.perplexity.ai/chat/completions",
+                json=data,
+                headers=self.headers,
+                timeout=10.0
+            )
+
+            if response.status_code == 204:
+                return "I couldn't find any current information about that."
+
+            if response.status_code != 200:
+                print(f"Perplexity API error: {response.status_code} - {response.text}")
+                return None
+
+            result = response.json()
+            content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+
+            # Clean up the response
+            content = content.replace('*', '').strip()
+            if '[' in content:
+                content = content.split('[')[0].strip()
+
+            return content
 
         except Exception as e:
             print(f"Search error: {e}")
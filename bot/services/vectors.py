@@ -0,0 +1,86 @@
+import re
+import zlib
+from collections import OrderedDict
+import numpy as np
+from config import settings
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+# Words that appear in nearly every stored memory ("User stated: ...") carry no signal
+STOPWORDS = frozenset({
+    "user", "stated", "i", "me", "my", "you", "your", "a", "an", "the", "is", "are", "am",
+    "was", "be", "to", "of", "and", "or", "in", "on", "it", "that", "this", "what", "do", "does"
+})
+
+
+def encode(text: str, dim: int = None) -> np.ndarray:
+    """
+    Embed text locally with feature hashing over unigrams and bigrams.
+    Uses signed buckets, sublinear term frequency and L2 normalisation, so a dot
+    product between two vectors is their cosine similarity.
+    """
+    dim = dim or settings.EMBEDDING_DIM
+    vector = np.zeros(dim, dtype=np.float32)
+    tokens = [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for feature in features:
+        # crc32 is stable across processes, unlike hash()
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def to_bytes(vector: np.ndarray) -> bytes:
+    """Serialise a vector as compact float32 bytes for storage."""
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float32)
+
+
+class MemoryVectorIndex:
+    """
+    In-memory cache of long-term memory embeddings per retrieval key
+    (user_id, server_id, candidate limit). Each entry keeps the memories alongside
+    one float32 matrix so a query is ranked against all of them with a single
+    matrix-vector product.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (user_id, server_id, limit) -> (memories, matrix)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def load(self, key: tuple, memories: list):
+        """Build the matrix for a user's memories, encoding rows stored without an embedding."""
+        dim = settings.EMBEDDING_DIM
+        matrix = np.zeros((len(memories), dim), dtype=np.float32)
+        for i, memory in enumerate(memories):
+            stored = from_bytes(memory.embedding) if memory.embedding else None
+            matrix[i] = stored if stored is not None and stored.shape[0] == dim else encode(memory.content, dim)
+        self._entries[key] = (memories, matrix)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def top_k(self, key: tuple, query: str, k: int) -> list:
+        """Return up to k cached memories for key, most similar to query first."""
+        if k <= 0:
+            return []
+        memories, matrix = self._entries[key]
+        self._entries.move_to_end(key)
+        similarities = matrix @ encode(query, matrix.shape[1])
+        if len(memories) > k:
+            top = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            top = np.arange(len(memories))
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return [memories[i] for i in top]
+
+    def invalidate(self, user_id: int):
+        """Drop every cached entry for a user (their memories changed)."""
+        for key in [key for key in self._entries if key[0] == user_id]:
+            del self._entries[key]
@@ -10,5 +10,133 @@ class Settings:
     PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
     PREFIX = "!"
     HISTORY_FILE = "conversation_history.json"
-    DATABASE_URL = os.getenv("DATABASE_URL")
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///vigil.db")  # Embedded SQLite unless Postgres is configured
+
+    # Async database pool (timeouts in seconds); statement cache off for transaction-mode poolers
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_STATEMENT_TIMEOUT = float(os.getenv("DB_STATEMENT_TIMEOUT", "5"))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "0"))
+
+    # Embedded SQLite: reader connections, lock wait (seconds), page cache and memory-mapped I/O (MiB)
+    SQLITE_READERS = int(os.getenv("SQLITE_READERS", "4"))
+    SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+    SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+    SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+
+    # Short-term write-behind buffer: flush at this many rows or every N seconds
+    SHORT_TERM_FLUSH_ROWS = int(os.getenv("SHORT_TERM_FLUSH_ROWS", "100"))
+    SHORT_TERM_FLUSH_INTERVAL = float(os.getenv("SHORT_TERM_FLUSH_INTERVAL", "2.0"))
+    SHORT_TERM_FLUSH_RETRIES = int(os.getenv("SHORT_TERM_FLUSH_RETRIES", "3"))  # Then isolate rejected rows
+    SHORT_TERM_BUFFER_MAX_ROWS = int(os.getenv("SHORT_TERM_BUFFER_MAX_ROWS", "10000"))
+
+    # In-process short-term conversation cache: max active users kept in memory
+    SHORT_TERM_CACHE_USERS = int(os.getenv("SHORT_TERM_CACHE_USERS", "5000"))
+
+    # Short-term expiry: daily partitions on PostgreSQL, chunked DELETE elsewhere
+    SHORT_TERM_PARTITIONING = os.getenv("SHORT_TERM_PARTITIONING", "true").lower() == "true"
+    SHORT_TERM_PARTITIONS_AHEAD = int(os.getenv("SHORT_TERM_PARTITIONS_AHEAD", "3"))
+    SHORT_TERM_CLEANUP_MINUTES = float(os.getenv("SHORT_TERM_CLEANUP_MINUTES", "15"))
+    SHORT_TERM_DELETE_CHUNK = int(os.getenv("SHORT_TERM_DELETE_CHUNK", "1000"))
+    SHORT_TERM_DELETE_MAX_CHUNKS = int(os.getenv("SHORT_TERM_DELETE_MAX_CHUNKS", "50"))
+
+    # Shared outbound HTTP transport (search, image generation): pool, per-host limit, timeouts (seconds)
+    HTTP2 = os.getenv("HTTP2", "false").lower() == "true"  # Requires httpx[http2]
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    HTTP_PER_HOST_CONNECTIONS = int(os.getenv("HTTP_PER_HOST_CONNECTIONS", "20"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5.0"))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30.0"))
+
+    # Image generation jobs: concurrent job cap, overall timeout and adaptive status polling (seconds)
+    IMAGE_MAX_CONCURRENT_JOBS = int(os.getenv("IMAGE_MAX_CONCURRENT_JOBS", "10"))
+    IMAGE_JOB_TIMEOUT = float(os.getenv("IMAGE_JOB_TIMEOUT", "300"))
+    IMAGE_POLL_INITIAL = float(os.getenv("IMAGE_POLL_INITIAL", "2.0"))
+    IMAGE_POLL_BACKOFF = float(os.getenv("IMAGE_POLL_BACKOFF", "1.5"))
+    IMAGE_POLL_MAX = float(os.getenv("IMAGE_POLL_MAX", "10.0"))
+    # Per-guild and per-user running jobs, and how many requests a user may have waiting
+    IMAGE_GUILD_CONCURRENCY = int(os.getenv("IMAGE_GUILD_CONCURRENCY", "3"))
+    IMAGE_USER_CONCURRENCY = int(os.getenv("IMAGE_USER_CONCURRENCY", "1"))
+    IMAGE_USER_MAX_QUEUED = int(os.getenv("IMAGE_USER_MAX_QUEUED", "3"))
+    # Repeated prompts reuse a finished image within this window (seconds)
+    IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "500"))
+    IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "3600"))
+
+    # Anthropic client: connection pool and timeouts (seconds)
+    ANTHROPIC_MAX_CONNECTIONS = int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", "50"))
+    ANTHROPIC_MAX_KEEPALIVE = int(os.getenv("ANTHROPIC_MAX_KEEPALIVE", "20"))
+    ANTHROPIC_MAX_RETRIES = int(os.getenv("ANTHROPIC_MAX_RETRIES", "2"))  # Applied by the resilience layer
+    ANTHROPIC_CONNECT_TIMEOUT = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", "5.0"))
+    ANTHROPIC_TIMEOUT = float(os.getenv("ANTHROPIC_TIMEOUT", "60.0"))  # Reply generation
+    ANTHROPIC_CLASSIFIER_TIMEOUT = float(os.getenv("ANTHROPIC_CLASSIFIER_TIMEOUT", "10.0"))
+
+    # Classifier decision cache: max entries and per-classifier TTLs (seconds)
+    DECISION_CACHE_SIZE = int(os.getenv("DECISION_CACHE_SIZE", "10000"))
+    ROUTE_CACHE_TTL = float(os.getenv("ROUTE_CACHE_TTL", "3600"))
+    SEARCH_DECISION_TTL = float(os.getenv("SEARCH_DECISION_TTL", "3600"))
+    RECALL_DECISION_TTL = float(os.getenv("RECALL_DECISION_TTL", "21600"))
+    SAVE_DECISION_TTL = float(os.getenv("SAVE_DECISION_TTL", "21600"))
+    RELEVANCE_DECISION_TTL = float(os.getenv("RELEVANCE_DECISION_TTL", "3600"))
+
+    # Web search answer cache: max queries, fresh TTL and extra stale-while-revalidate window (seconds)
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+    SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+    SEARCH_STALE_TTL = float(os.getenv("SEARCH_STALE_TTL", "900"))
+
+    # Batched long-term memory scoring
+    MEMORY_SCORE_BATCH_SIZE = int(os.getenv("MEMORY_SCORE_BATCH_SIZE", "40"))
+    MEMORY_SCORE_CONCURRENCY = int(os.getenv("MEMORY_SCORE_CONCURRENCY", "4"))
+
+    # Local vector index for long-term memory retrieval
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+    MEMORY_VECTOR_TOP_K = int(os.getenv("MEMORY_VECTOR_TOP_K", "20"))
+    MEMORY_KEYWORD_TOP_K = int(os.getenv("MEMORY_KEYWORD_TOP_K", "20"))  # Full-text matches sent to scoring
+    MEMORY_CANDIDATE_LIMIT = int(os.getenv("MEMORY_CANDIDATE_LIMIT", "200"))  # Top rows read from the database
+    VECTOR_CACHE_USERS = int(os.getenv("VECTOR_CACHE_USERS", "1000"))
+
+    # Long-term consolidation: run interval, duplicate similarity, importance decay period and per-user cap
+    MEMORY_CONSOLIDATION_HOURS = float(os.getenv("MEMORY_CONSOLIDATION_HOURS", "6"))
+    MEMORY_DUPLICATE_SIMILARITY = float(os.getenv("MEMORY_DUPLICATE_SIMILARITY", "0.9"))
+    MEMORY_DECAY_DAYS = float(os.getenv("MEMORY_DECAY_DAYS", "60"))
+    MEMORY_MAX_PER_USER = int(os.getenv("MEMORY_MAX_PER_USER", "200"))
+
+    # Streamed replies: post early tokens, then edit at a rate-limit-safe cadence (seconds)
+    STREAM_REPLIES = os.getenv("STREAM_REPLIES", "true").lower() == "true"
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.2"))
+
+    # Message pipeline: fetch short-term history while routing runs. SPECULATIVE_SEARCH also starts
+    # the (paid) web search early for messages the local prefilter thinks need one
+    SPECULATIVE_PIPELINE = os.getenv("SPECULATIVE_PIPELINE", "true").lower() == "true"
+    SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "false").lower() == "true"
+
+    # Input-token budget for an assembled reply prompt
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+
+    # LLM scheduler: requests per minute and concurrent requests per model
+    FAST_MODEL_RPM = float(os.getenv("FAST_MODEL_RPM", "1000"))
+    FAST_MODEL_CONCURRENCY = int(os.getenv("FAST_MODEL_CONCURRENCY", "20"))
+    REPLY_MODEL_RPM = float(os.getenv("REPLY_MODEL_RPM", "200"))
+    REPLY_MODEL_CONCURRENCY = int(os.getenv("REPLY_MODEL_CONCURRENCY", "10"))
+
+    # Background memory ingestion: queue bound, batch size, batch wait and shutdown drain (seconds)
+    MEMORY_QUEUE_SIZE = int(os.getenv("MEMORY_QUEUE_SIZE", "1000"))
+    MEMORY_BATCH_SIZE = int(os.getenv("MEMORY_BATCH_SIZE", "50"))
+    MEMORY_BATCH_WAIT = float(os.getenv("MEMORY_BATCH_WAIT", "0.5"))
+    MEMORY_DRAIN_TIMEOUT = float(os.getenv("MEMORY_DRAIN_TIMEOUT", "15"))
+
+    # LLM resilience: retries (seconds of backoff), circuit breakers and hedged requests
+    LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+    LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+    LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"  # Opt-in: duplicates slow calls
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+
+    # Local routing pre-classifier: minimum confidence to skip the LLM, optional .npz logistic model
+    PREFILTER_THRESHOLD = float(os.getenv("PREFILTER_THRESHOLD", "0.85"))
+    PREFILTER_MODEL_PATH = os.getenv("PREFILTER_MODEL_PATH")
+
 settings = Settings()
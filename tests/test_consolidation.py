@@ -0,0 +1,90 @@
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytz
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from bot.models.consolidation import fact_slots, plan_consolidation  # noqa: E402
+
+NOW = datetime(2026, 6, 1, tzinfo=pytz.UTC)
+DECAY_AFTER = timedelta(days=60)
+
+
+def memory(id, content, days_old, importance=3, type="fact", server_id=None, decayed_at=None):
+    return SimpleNamespace(
+        id=id,
+        server_id=server_id,
+        type=type,
+        content=content,
+        importance=importance,
+        embedding=None,
+        created_at=NOW - timedelta(days=days_old),
+        decayed_at=decayed_at
+    )
+
+
+def plan(rows, max_memories=100):
+    return plan_consolidation(rows, NOW, similarity=0.9, decay_after=DECAY_AFTER, max_memories=max_memories)
+
+
+def test_fact_slots_finds_every_slot():
+    assert fact_slots("User stated: my favourite color is red and my favorite food is pizza") == {
+        "favorite color", "favorite food"
+    }
+    assert fact_slots("User stated: I'm 30 years old") == {"age"}
+    assert fact_slots("User stated: I like hiking") == set()
+
+
+def test_newer_fact_supersedes_older_value():
+    rows = [
+        memory(1, "User stated: my favorite color is green", days_old=10),
+        memory(2, "User stated: my favorite color is blue", days_old=1),
+    ]
+    delete_ids, _ = plan(rows)
+    assert delete_ids == {1}
+
+
+def test_fact_stating_several_slots_is_not_superseded():
+    rows = [
+        memory(1, "User stated: my favorite color is red and my favorite food is pizza", days_old=10),
+        memory(2, "User stated: my favorite color is blue", days_old=1),
+    ]
+    delete_ids, _ = plan(rows)
+    assert delete_ids == set()
+
+
+def test_scopes_are_consolidated_separately():
+    rows = [
+        memory(1, "User stated: my favorite color is green", days_old=10, server_id=7),
+        memory(2, "User stated: my favorite color is blue", days_old=1),
+    ]
+    delete_ids, _ = plan(rows)
+    assert delete_ids == set()
+
+
+def test_duplicate_collapses_into_newest_with_highest_importance():
+    rows = [
+        memory(1, "User stated: I have a dog named Rex", days_old=10, importance=5),
+        memory(2, "User stated: I have a dog named Rex", days_old=1, importance=2),
+    ]
+    delete_ids, updates = plan(rows)
+    assert delete_ids == {1}
+    assert updates[2] == {"decayed_at": NOW, "importance": 5}
+
+
+def test_importance_decays_per_full_period():
+    rows = [memory(1, "User stated: I play the violin", days_old=130, importance=4)]
+    _, updates = plan(rows)
+    assert updates[1] == {"importance": 2, "decayed_at": rows[0].created_at + 2 * DECAY_AFTER}
+
+
+def test_only_the_most_important_memories_are_kept():
+    rows = [
+        memory(1, "User stated: I play the violin", days_old=1, importance=2),
+        memory(2, "User stated: I live in Lisbon", days_old=1, importance=5),
+        memory(3, "User stated: I am allergic to peanuts", days_old=1, importance=4),
+    ]
+    delete_ids, _ = plan(rows, max_memories=2)
+    assert delete_ids == {1}
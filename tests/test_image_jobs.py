@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from bot.services.image_jobs import FairJobQueue  # noqa: E402
+
+
+def test_cancelled_waiter_is_skipped_when_a_slot_is_released():
+    async def scenario():
+        queue = FairJobQueue(total=1, per_guild=1, per_user=1, max_queued_per_user=3)
+        release = asyncio.Event()
+        ran = []
+
+        async def job(user_id, hold=None):
+            async with queue.slot(user_id, guild_id=1):
+                ran.append(user_id)
+                if hold is not None:
+                    await hold.wait()
+
+        first = asyncio.create_task(job(1, hold=release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(job(2))
+        later = asyncio.create_task(job(3))
+        await asyncio.sleep(0)
+
+        # Release the slot, then cancel a queued waiter: the release runs before its cleanup
+        release.set()
+        queued.cancel()
+        await asyncio.wait_for(asyncio.gather(first, later, queued, return_exceptions=True), 5)
+
+        assert queued.cancelled()
+        assert ran == [1, 3]
+        assert queue.running == 0
+        assert not queue.guild_running and not queue.user_running
+        assert queue.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_quota_failure_is_not_shared_with_joined_callers():
+    from contextlib import asynccontextmanager
+    from bot.services.image_jobs import ImageJobTracker, QuotaExceededError
+
+    class Response:
+        status_code = 200
+
+        @staticmethod
+        def json():
+            return {"sdGenerationJob": {"generationId": None}}
+
+    class Http:
+        async def post(self, url, **kwargs):
+            return Response()
+
+    @asynccontextmanager
+    async def slot(user_id, guild_id):
+        await asyncio.sleep(0)
+        if user_id == 1:
+            raise QuotaExceededError("user 1 is over quota")
+        yield
+
+    async def scenario():
+        tracker = ImageJobTracker(Http())
+        tracker.queue.slot = slot
+        # User 1 starts the flight and fails on quota; user 2 joins it before that happens
+        first = asyncio.create_task(tracker.generate("same prompt", user_id=1, guild_id=1))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(tracker.generate("same prompt", user_id=2, guild_id=2))
+
+        results = await asyncio.wait_for(asyncio.gather(first, second), 5)
+        assert results[0]["status"] == "QUOTA"
+        assert results[1]["status"] == "NO_ID"  # User 2 ran a job of their own
+
+    asyncio.run(scenario())
+
+
+def test_dead_poller_is_restarted_for_new_jobs(monkeypatch):
+    from bot.services.image_jobs import ImageJobTracker
+    from config import settings
+
+    monkeypatch.setattr(settings, "IMAGE_POLL_INITIAL", 0.0)
+
+    class Response:
+        status_code = 200
+
+        def __init__(self, body):
+            self.body = body
+
+        def json(self):
+            return self.body
+
+    class Http:
+        async def post(self, url, **kwargs):
+            return Response({"sdGenerationJob": {"generationId": "gen-1"}})
+
+        async def get(self, url, **kwargs):
+            return Response({"generations_by_pk": {
+                "status": "COMPLETE",
+                "generated_images": [{"url": "https://example.com/1.png"}]
+            }})
+
+    async def crash():
+        raise RuntimeError("poller crashed")
+
+    async def scenario():
+        tracker = ImageJobTracker(Http())
+        tracker.task = asyncio.create_task(crash())
+        await asyncio.gather(tracker.task, return_exceptions=True)
+
+        result = await asyncio.wait_for(tracker.generate("a prompt", user_id=1, guild_id=1), 5)
+        assert result["status"] == "COMPLETE"
+        assert not tracker.task.done()
+        await tracker.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,42 @@
+import asyncio
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from bot.models.write_buffer import WriteBehindBuffer
+
+
+def test_rejected_rows_are_dropped_after_retries():
+    written = []
+
+    async def insert(rows):
+        if any(row["bad"] for row in rows):
+            if len(rows) == 1:
+                raise IntegrityError("INSERT", {}, Exception("constraint"))
+            raise IntegrityError("INSERT", {}, Exception("batch"))
+        written.extend(rows)
+
+    async def scenario():
+        buffer = WriteBehindBuffer(insert, flush_rows=100, flush_interval=60, max_retries=2)
+        await buffer.add([{"id": 1, "bad": False}, {"id": 2, "bad": True}, {"id": 3, "bad": False}])
+        await buffer.flush()
+        assert len(buffer.pending()) == 3  # First failure is retried
+        await buffer.flush()
+        assert buffer.pending() == []
+        assert [row["id"] for row in written] == [1, 3]
+
+    asyncio.run(scenario())
+
+
+def test_rows_are_kept_while_the_database_is_unreachable_and_capped():
+    async def insert(rows):
+        raise OperationalError("INSERT", {}, Exception("connection refused"))
+
+    async def scenario():
+        buffer = WriteBehindBuffer(insert, flush_rows=100, flush_interval=60, max_rows=5, max_retries=1)
+        await buffer.add([{"id": i} for i in range(4)])
+        await buffer.flush()
+        assert len(buffer.pending()) == 4  # Unreachable database: nothing dropped
+        await buffer.add([{"id": i} for i in range(4, 8)])
+        assert [row["id"] for row in buffer.pending()] == [3, 4, 5, 6, 7]
+
+    asyncio.run(scenario())